@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import Protocol
+from typing import TYPE_CHECKING, Dict, NamedTuple, Protocol, Sequence
+
+if TYPE_CHECKING:
+    from pydantic_ai.messages import ModelMessage
 
 
 class RunUsageLike(Protocol):
@@ -8,37 +11,166 @@ class RunUsageLike(Protocol):
 
     input_tokens: int
     output_tokens: int
-    # cached_input_tokens is not currently present on RunUsage, but we
-    # include it defensively and default to 0 if missing.
+    # cache_read_tokens is the portion of input_tokens that was served from
+    # the provider's prompt cache (OpenAI's prompt_tokens_details.cached_tokens).
+    # It is read defensively and defaults to 0 if missing. Those tokens are
+    # billed at the cached rate instead of the full input rate.
     # details: dict | None  # not needed for cost calculation
 
 
-# Pricing constants for gpt-5.1 (USD per 1M tokens)
-INPUT_PRICE_PER_MILLION = 1.25
-OUTPUT_PRICE_PER_MILLION = 10.00
-CACHED_INPUT_PRICE_PER_MILLION = 0.125
+class PriceRow(NamedTuple):
+    """
+    Token prices for a single model, in nano-dollars (1e-9 USD) per token.
+
+    $1.25 per 1M tokens == 1250 nano-dollars per token, so every price is an
+    exact integer and the cost can be computed without floating-point error.
+    """
+
+    input: int
+    output: int
+    cached_input: int
+
+
+# Prices per model name, as published by the provider (USD per 1M tokens
+# converted to nano-dollars per token). Provider prefixes such as "openai:"
+# are ignored when looking up a model.
+PRICES: Dict[str, PriceRow] = {
+    "gpt-5.1": PriceRow(input=1_250, output=10_000, cached_input=125),
+    "gpt-5": PriceRow(input=1_250, output=10_000, cached_input=125),
+    "gpt-5-mini": PriceRow(input=250, output=2_000, cached_input=25),
+    "gpt-5-nano": PriceRow(input=50, output=400, cached_input=5),
+    "gpt-4.1": PriceRow(input=2_000, output=8_000, cached_input=500),
+    "gpt-4o": PriceRow(input=2_500, output=10_000, cached_input=1_250),
+    "gpt-4o-mini": PriceRow(input=150, output=600, cached_input=75),
+}
+
+DEFAULT_MODEL = "gpt-5.1"
+
+NANO_USD_PER_USD = 1_000_000_000
+
+# Average number of characters per token for English text with OpenAI's
+# tokenizers. Used to estimate prompt sizes before a call is made.
+CHARS_PER_TOKEN = 4
 
 
-def calculate_cost(usage: RunUsageLike) -> str:
+class BudgetExceededError(RuntimeError):
+    """Raised when the estimated cost of a model call exceeds its budget."""
+
+
+def get_price_row(model: str) -> PriceRow:
+    """
+    Look up the PriceRow for a model name, with or without a provider prefix
+    (for example "gpt-5.1" or "openai:gpt-5.1").
+
+    Raises:
+        ValueError: If no prices are known for the model.
+    """
+    model_name = model.split(":", 1)[-1]
+    try:
+        return PRICES[model_name]
+    except KeyError:
+        raise ValueError(
+            f"No pricing known for model {model!r}; known models: {sorted(PRICES)}"
+        ) from None
+
+
+def calculate_cost(usage: RunUsageLike, model: str = DEFAULT_MODEL) -> str:
     """
     Calculate the approximate cost of a run based on token usage.
 
     Args:
         usage: An object with at least `input_tokens` and `output_tokens`
-               attributes, and optionally `cached_input_tokens`.
+               attributes, and optionally `cache_read_tokens` (the portion
+               of `input_tokens` that was served from the provider's cache).
+        model: The model the tokens were billed for, a key of PRICES
+               optionally prefixed with a provider (for example "openai:").
 
     Returns:
         A string formatted as: "Cost: $0.XXXXXXX"
     """
-    input_tokens = getattr(usage, "input_tokens", 0) or 0
-    output_tokens = getattr(usage, "output_tokens", 0) or 0
-    cached_input_tokens = getattr(usage, "cached_input_tokens", 0) or 0
+    prices = get_price_row(model)
+
+    try:
+        cached_input_tokens = usage.cache_read_tokens or 0  # type: ignore[attr-defined]
+    except AttributeError:
+        cached_input_tokens = 0
 
-    input_cost = (input_tokens / 1_000_000) * INPUT_PRICE_PER_MILLION
-    output_cost = (output_tokens / 1_000_000) * OUTPUT_PRICE_PER_MILLION
-    cached_input_cost = (cached_input_tokens / 1_000_000) * CACHED_INPUT_PRICE_PER_MILLION
+    # Cached tokens are already counted in input_tokens; bill them only once,
+    # at the discounted rate.
+    billable_input_tokens = max(0, usage.input_tokens - cached_input_tokens)
 
-    total_cost = input_cost + output_cost + cached_input_cost
+    total_nano_usd = (
+        billable_input_tokens * prices.input
+        + usage.output_tokens * prices.output
+        + cached_input_tokens * prices.cached_input
+    )
 
     # Format to 7 decimal places as requested
-    return f"Cost: ${total_cost:.7f}"
+    return f"Cost: ${total_nano_usd / NANO_USD_PER_USD:.7f}"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in text, rounding up.
+
+    This is a character-count heuristic rather than an exact tokenizer, which
+    is accurate enough for a cost preflight and needs no extra dependency.
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def messages_text(messages: Sequence[ModelMessage]) -> str:
+    """
+    Render the text a model is sent for a conversation, for estimating its
+    tokens: system and user prompts, earlier responses, tool calls and tool
+    results. Non-text content such as images is left out.
+    """
+    from pydantic_ai.messages import RetryPromptPart, ToolCallPart, ToolReturnPart
+
+    chunks: list[str] = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, ToolCallPart):
+                chunks.append(part.tool_name)
+                chunks.append(part.args_as_json_str())
+            elif isinstance(part, ToolReturnPart):
+                chunks.append(part.model_response_str())
+            elif isinstance(part, RetryPromptPart):
+                chunks.append(part.model_response())
+            else:
+                content = getattr(part, "content", None)
+                if isinstance(content, str):
+                    chunks.append(content)
+                elif isinstance(content, Sequence):
+                    chunks.extend(item for item in content if isinstance(item, str))
+    return "\n".join(chunks)
+
+
+def estimate_input_cost(model: str, *texts: str) -> int:
+    """
+    Estimate the input cost of sending texts to a model, in nano-dollars.
+
+    Every token is priced at the full (uncached) input rate, so the estimate
+    is an upper bound on what the provider will bill for the input.
+    """
+    input_tokens = sum(estimate_tokens(text) for text in texts)
+    return input_tokens * get_price_row(model).input
+
+
+def check_input_budget(model: str, max_input_cost_usd: float, *texts: str) -> int:
+    """
+    Check the estimated input cost of a model call against a budget.
+
+    Returns:
+        The estimated input cost in nano-dollars.
+
+    Raises:
+        BudgetExceededError: If the estimated input cost exceeds the budget.
+    """
+    estimated_nano_usd = estimate_input_cost(model, *texts)
+    if estimated_nano_usd > round(max_input_cost_usd * NANO_USD_PER_USD):
+        raise BudgetExceededError(
+            f"Estimated input cost ${estimated_nano_usd / NANO_USD_PER_USD:.7f} for model "
+            f"{model!r} exceeds the budget of ${max_input_cost_usd:.7f}"
+        )
+    return estimated_nano_usd
@@ -1,13 +1,27 @@
-import json
+import asyncio
+import functools
+import hashlib
+import os
+import tempfile
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Annotated, Any, ClassVar, Dict, List, Mapping, Optional, Set, Tuple, TypedDict
 import logging
 from pathlib import Path
 from pprint import pformat
-
-from pydantic_ai import Agent, StructuredDict, Tool, format_as_xml
-
-from task_decomposition.models_schema import Task
+from types import MappingProxyType
+from xml.sax.saxutils import escape
+
+from pydantic import Field
+from pydantic_ai import Agent, Tool
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.usage import RunUsage
+from pydantic_core import from_json, to_json
+
+from task_decomposition.cost_calculator import check_input_budget
+from task_decomposition.models_schema import Task, item_key
+from task_decomposition.prompt_caching import prompt_cache_settings
+from task_decomposition.rate_limiter import RateLimitedModel, RateLimiter, call_with_backoff
 from task_decomposition.task_graph_builder import DelegateRunResult
 
 logger = logging.getLogger(__name__)
@@ -20,6 +34,15 @@ OUTPUT_ROOT = Path.cwd() / "output"
 # and set via `set_run_output_dir`. Defaults to OUTPUT_ROOT if not set.
 RUN_OUTPUT_DIR: Path = OUTPUT_ROOT
 
+# Directories that save_file has already created during this process, so
+# repeated writes into the same directory skip the mkdir syscalls.
+_CREATED_DIRS: Set[Path] = set()
+
+# Files written by save_file during the current delegate run, as
+# (relative_path, content) pairs. Set by DelegateRunner while a run is in
+# progress so the writes can be stored alongside the cached response.
+_SAVED_FILES: ContextVar[Optional[List[Tuple[str, str]]]] = ContextVar("_SAVED_FILES", default=None)
+
 
 def set_run_output_dir(path: Path) -> None:
     """
@@ -31,13 +54,17 @@ def set_run_output_dir(path: Path) -> None:
 
     Args:
         path: Absolute path to the directory where all relative paths
-              passed to save_file will be rooted.
+              passed to save_file will be rooted. It is created if missing.
     """
     global RUN_OUTPUT_DIR
+    # Resolve once so save_file can build absolute paths without touching disk
+    path = path.resolve()
+    path.mkdir(parents=True, exist_ok=True)
+    _CREATED_DIRS.add(path)
     RUN_OUTPUT_DIR = path
 
 
-@dataclass
+@dataclass(frozen=True)
 class DelegateContext:
     """
     Context required by a DelegateRunner to form its inputs for a task run.
@@ -47,9 +74,19 @@ class DelegateContext:
             object for all tasks that this task depends on.
         dependency_results: A mapping from task ID to the DelegateRunResult
             produced when executing that dependency task.
+
+    DelegateContext.EMPTY is a shared instance for tasks without dependencies.
     """
-    dependency_tasks: Dict[str, Task]
-    dependency_results: Dict[str, DelegateRunResult]
+    dependency_tasks: Mapping[str, Task]
+    dependency_results: Mapping[str, DelegateRunResult]
+
+    EMPTY: ClassVar["DelegateContext"]
+
+
+DelegateContext.EMPTY = DelegateContext(
+    dependency_tasks=MappingProxyType({}),
+    dependency_results=MappingProxyType({}),
+)
 
 
 def save_file(relative_path: str, content: str) -> str:
@@ -74,20 +111,250 @@ def save_file(relative_path: str, content: str) -> str:
             f"save_file tool only accepts relative paths, got absolute path: {relative_path!r}"
         )
 
-    # Ensure the run output directory exists
-    RUN_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
+    # The run output directory is created by set_run_output_dir; creating the
+    # parent directory with parents=True also covers the unset default.
     target_path = RUN_OUTPUT_DIR / rel_path
-    target_path.parent.mkdir(parents=True, exist_ok=True)
-    target_path.write_text(content, encoding="utf-8")
+    parent = target_path.parent
+    if parent not in _CREATED_DIRS:
+        parent.mkdir(parents=True, exist_ok=True)
+        _CREATED_DIRS.add(parent)
+    # Write the encoded bytes directly, skipping the text-mode IO wrapper and
+    # newline translation
+    data = content.encode("utf-8")
+    target_path.write_bytes(data)
+
+    saved_files = _SAVED_FILES.get()
+    if saved_files is not None:
+        saved_files.append((relative_path, content))
 
     logger.info(
         "save_file tool wrote %d bytes to %s (run output dir: %s)",
-        len(content),
+        len(data),
         target_path,
         RUN_OUTPUT_DIR,
     )
-    return str(target_path.resolve())
+    # RUN_OUTPUT_DIR is already absolute, so only paths that step out with
+    # ".." need resolving.
+    if ".." in rel_path.parts:
+        target_path = target_path.resolve()
+    return str(target_path)
+
+
+# Static delegate system prompt. It is identical for every task (task-specific
+# instructions travel in the user prompt), so it forms a stable prefix that the
+# provider can serve from its prompt cache.
+_SYSTEM_PROMPT = (
+    "You are executing a task in a dependency graph.\n"
+    "You are given the current task and the results of its dependency tasks.\n"
+    "The <current_task> section identifies the task you must now execute.\n"
+    "Each item in the <dependencies> section lists the outputs of a dependency\n"
+    "task that you may use as inputs, and the inputs the current task expects\n"
+    "from that dependency.\n"
+    "The instructions for the current task are in the <current_task_prompt>\n"
+    "section at the end of the message.\n"
+    "Use the dependency outputs, guided by their descriptions and the\n"
+    "current task's input descriptions, as inputs to complete the current\n"
+    "task. Return your answer strictly according to the OutputSpecification.\n\n"
+    "You also have access to a tool named `save_file` that allows you to write\n"
+    "text content to files on disk. Use this tool whenever the task's intent\n"
+    "or outputs describe creating or updating documents or other file-based\n"
+    "artifacts.\n\n"
+    "Tool: save_file(relative_path: string, content: string) -> string\n"
+    "- `relative_path` is a relative file path and filename, such as\n"
+    "  'docs/foo/blah.md'. It must NOT be an absolute path.\n"
+    "- `content` is the full text content to write into the file.\n"
+    "- The tool will create any missing parent directories automatically.\n"
+    "- The tool returns the absolute path of the file that was written.\n\n"
+    "Guidance for using save_file:\n"
+    "- Choose clear, descriptive relative paths that reflect the purpose of\n"
+    "  the file (for example, 'docs/locations/sandpoint_hinterlands.md').\n"
+    "- Ensure that the content you pass is exactly what should appear in the\n"
+    "  file, including any required formatting such as Markdown.\n"
+    "- If the task requires multiple files, call `save_file` once for each\n"
+    "  file you need to create.\n"
+)
+
+
+# A hashable signature of a Task's declared outputs: ((type, description), ...).
+# Tasks with identical output specifications share the same signature.
+OutputsKey = Tuple[Tuple[str, str], ...]
+
+
+def _outputs_key(task: Task) -> OutputsKey:
+    return tuple((output.type, output.description) for output in task.outputs)
+
+
+# Python type used to validate each declared output type
+_OUTPUT_PYTHON_TYPES: Dict[str, type] = {
+    "string": str,
+    "integer": int,
+    "float": float,
+    "boolean": bool,
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _build_output_type(outputs_key: OutputsKey) -> Any:
+    """
+    Build the output type for a given outputs signature.
+
+    The result is a TypedDict with one required, typed and described field
+    per output (item_0, item_1, ...), so pydantic-ai validates the values
+    against their declared types and asks the model to retry on a mismatch.
+    Cached so that retries and tasks with identical output specifications
+    share one class and its compiled validator.
+    """
+    fields = {
+        item_key(index): Annotated[_OUTPUT_PYTHON_TYPES[type_], Field(description=description)]
+        for index, (type_, description) in enumerate(outputs_key)
+    }
+    return TypedDict("OutputSpecification", fields)  # type: ignore[operator]
+
+
+def _partial_output_count(response: ModelResponse) -> int:
+    """
+    Count the outputs received so far in a streamed delegate response.
+
+    Typed outputs only validate once every field is present, so progress is
+    read from the partial arguments of the output tool call instead.
+    """
+    for part in response.parts:
+        if isinstance(part, ToolCallPart) and part.tool_name != save_file.__name__:
+            args = part.args
+            if isinstance(args, str):
+                args = from_json(args, allow_partial=True) if args else {}
+            return len(args) if isinstance(args, dict) else 0
+    return 0
+
+
+@functools.lru_cache(maxsize=16)
+def _build_agent(model: str, system_prompt: str) -> Agent:
+    """
+    Build the delegate Agent for a model and system prompt.
+
+    Cached so that every task shares one Agent (and its provider client and
+    tool registrations). The output type differs per task, so it is passed to
+    Agent.run rather than fixed here.
+    """
+    return Agent(
+        model,
+        system_prompt=system_prompt,
+        tools=[Tool(save_file, takes_ctx=False)],
+        model_settings=prompt_cache_settings(model, system_prompt),
+    )
+
+
+def _read_disk_cache(cache_dir: Path, cache_key: str) -> Optional[DelegateRunResult]:
+    """
+    Load a delegate response persisted by _write_disk_cache, or None on a miss.
+
+    The files the delegate saved are written again into the current run
+    output directory, so a cache hit leaves the same artifacts on disk as the
+    original call did.
+
+    An entry that cannot be read back (truncated, corrupt or written in an
+    older format) is logged, deleted and treated as a miss, so the delegate
+    is called again instead of failing the run.
+    """
+    entry_path = cache_dir / f"{cache_key}.json"
+    try:
+        entry = from_json(entry_path.read_bytes())
+        files = [(relative_path, content) for relative_path, content in entry["files"]]
+        run_result = DelegateRunResult(
+            id=entry["id"],
+            output_types=tuple(entry["output_types"]),
+            outputs=tuple(entry["outputs"]),
+            usage=RunUsage(),
+        )
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as exc:
+        logger.warning("Discarding unreadable delegate cache entry %s: %s", entry_path, exc)
+        entry_path.unlink(missing_ok=True)
+        return None
+
+    for relative_path, content in files:
+        save_file(relative_path, content)
+
+    return run_result
+
+
+def _write_disk_cache(
+    cache_dir: Path,
+    cache_key: str,
+    run_result: DelegateRunResult,
+    saved_files: List[Tuple[str, str]],
+) -> None:
+    """
+    Persist a delegate response and the files saved while producing it.
+
+    The entry is written to a temporary file and renamed into place, so a
+    concurrent reader never sees a partially written entry.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(
+            to_json(
+                {
+                    "id": run_result.id,
+                    "output_types": run_result.output_types,
+                    "outputs": run_result.outputs,
+                    "files": saved_files,
+                }
+            )
+        )
+    os.replace(tmp_name, cache_dir / f"{cache_key}.json")
+
+
+# Shown to the delegate in place of the outputs of a dependency without a run result
+_NO_RESULT_NOTE = "No run result is available for this dependency. It may not have had an output."
+
+
+def _output_records(dep_task: Task, dep_result: DelegateRunResult) -> List[Dict[str, Any]]:
+    """
+    Pair each declared output of a dependency with its value from the run
+    result, in the order they are shown to the delegate.
+
+    Raises:
+        ValueError: If the run result does not hold exactly one value per
+            declared output, so no value is silently dropped or misattributed.
+    """
+    if len(dep_result.outputs) != len(dep_task.outputs):
+        raise ValueError(
+            f"Run result of dependency '{dep_task.id}' has {len(dep_result.outputs)} "
+            f"outputs but the task declares {len(dep_task.outputs)}"
+        )
+    return [
+        {
+            "index": index,
+            "description": output_spec.description,
+            "declared_type": output_spec.type,
+            "value": value,
+        }
+        for index, (output_spec, value) in enumerate(zip(dep_task.outputs, dep_result.outputs))
+    ]
+
+
+def _xml_scalar(value: Any) -> str:
+    return "null" if value is None else escape(str(value))
+
+
+def _emit_xml_records(lines: List[str], tag: str, records: List[Dict[str, Any]], indent: str) -> None:
+    """
+    Emit a list of flat records as <tag><item>...</item></tag>, matching the
+    layout format_as_xml uses for lists of dicts.
+    """
+    if not records:
+        lines.append(f"{indent}<{tag} />")
+        return
+    lines.append(f"{indent}<{tag}>")
+    for record in records:
+        lines.append(f"{indent}  <item>")
+        for key, value in record.items():
+            lines.append(f"{indent}    <{key}>{_xml_scalar(value)}</{key}>")
+        lines.append(f"{indent}  </item>")
+    lines.append(f"{indent}</{tag}>")
 
 
 class DelegateRunner:
@@ -99,152 +366,213 @@ class DelegateRunner:
     to an LLM or other agents can be swapped out or mocked in tests.
     """
 
+    def __init__(
+        self,
+        model: str = "openai:gpt-5.1",
+        max_input_cost_usd: Optional[float] = None,
+        stream: bool = False,
+        cache_dir: Optional[Path] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        self._model = model
+        # Shared with the planner so every request to the provider counts
+        # against the same request and token limits. Throttled calls are
+        # retried with backoff whether or not a limiter is set.
+        self._rate_limiter = rate_limiter
+        # When set, responses are persisted as JSON files in this directory,
+        # so repeating an identical call, in this run or a later one, skips
+        # the model entirely.
+        self._cache_dir = cache_dir
+        # When set, delegate responses are consumed with pydantic-ai's streaming
+        # API and progress is reported as each output value arrives.
+        self._stream = stream
+        # Optional per-task budget for the estimated input cost of a delegate
+        # call. Calls estimated to exceed it are refused before reaching the model.
+        self._max_input_cost_usd = max_input_cost_usd
+
     def run(self, task: Task, delegate_context: DelegateContext) -> DelegateRunResult:
+        """
+        Synchronous wrapper around run_async for callers without an event loop.
+        """
+        return asyncio.run(self.run_async(task, delegate_context))
+
+    async def run_async(self, task: Task, delegate_context: DelegateContext) -> DelegateRunResult:
         """
         Execute the given Task using the provided delegate_context and return
         a DelegateRunResult.
 
+        The delegate call is awaited rather than blocking, so independent tasks
+        can be executed concurrently by the caller.
+
         Implementations are responsible for:
         - Constructing the actual prompt / tool call from `task` and `delegate_context`
         - Executing the delegate agent (e.g., LLM, tool, service)
         - Mapping the raw outputs into a DelegateRunResult that matches
           the task's declared outputs.
         """
-        schema_dict = json.loads(task.OutputsToSchema())
-        task_output = StructuredDict(
-            schema_dict,
-            name="OutputSpecification",
-        )
-
         # Build a rich, structured prompt that explains:
         # - Which dependency each value came from (by task id)
         # - The description of each output from the producing task
         # - The actual value produced
         # - How the current task describes the inputs it expects from each dependency
-        prompt_dict = self.build_prompt_dict(delegate_context, task)
-
-        prompt = format_as_xml(prompt_dict)
-
-        system_prompt = (
-            "You are executing a task in a dependency graph.\n"
-            "You are given the current task and the results of its dependency tasks.\n"
-            "Use the dependency outputs, guided by their descriptions and the\n"
-            "current task's input descriptions, as inputs to complete the current\n"
-            "task. Return your answer strictly according to the OutputSpecification.\n\n"
-            "You also have access to a tool named `save_file` that allows you to write\n"
-            "text content to files on disk. Use this tool whenever the task's intent\n"
-            "or outputs describe creating or updating documents or other file-based\n"
-            "artifacts.\n\n"
-            "Tool: save_file(relative_path: string, content: string) -> string\n"
-            "- `relative_path` is a relative file path and filename, such as\n"
-            "  'docs/foo/blah.md'. It must NOT be an absolute path.\n"
-            "- `content` is the full text content to write into the file.\n"
-            "- The tool will create any missing parent directories automatically.\n"
-            "- The tool returns the absolute path of the file that was written.\n\n"
-            "Guidance for using save_file:\n"
-            "- Choose clear, descriptive relative paths that reflect the purpose of\n"
-            "  the file (for example, 'docs/locations/sandpoint_hinterlands.md').\n"
-            "- Ensure that the content you pass is exactly what should appear in the\n"
-            "  file, including any required formatting such as Markdown.\n"
-            "- If the task requires multiple files, call `save_file` once for each\n"
-            "  file you need to create.\n\n"
-        ) + task.prompt
-
-        agent = Agent(
-            "openai:gpt-5.1",
-            output_type=task_output,
-            system_prompt=system_prompt,
-            tools=[Tool(save_file, takes_ctx=False)],
+        # - The current task's own prompt, last, so the system prompt stays
+        #   identical across tasks and can be served from the provider's prompt cache
+        # Prompt building is pure CPU work that grows with the size of the
+        # dependency outputs, so run it off the event loop to keep sibling
+        # delegate calls in the same wave responsive.
+        prompt = await asyncio.to_thread(self.build_prompt_xml, delegate_context, task)
+
+        cache_key = self._response_cache_key(_SYSTEM_PROMPT, prompt, task)
+        if self._cache_dir is not None:
+            cached_result = _read_disk_cache(self._cache_dir, cache_key)
+            if cached_result is not None:
+                logger.info("DelegateRunner: disk cache hit for task '%s'", task.id)
+                return cached_result
+
+        if self._max_input_cost_usd is not None:
+            check_input_budget(self._model, self._max_input_cost_usd, _SYSTEM_PROMPT, prompt)
+
+        agent = _build_agent(self._model, _SYSTEM_PROMPT)
+        output_type = _build_output_type(_outputs_key(task))
+        # Each request of the run (tool round-trips and output retries
+        # included) goes through the limiter
+        model = (
+            RateLimitedModel(agent.model, self._rate_limiter)
+            if self._rate_limiter is not None
+            else None
         )
-        result = agent.run_sync(prompt)
-
-        # pydantic-ai returns the structured output on `result.output`,
-        # mirroring how main.py accesses the TaskPlan result.
-        # The StructuredDict output is an object with a `.data` dict that
-        # matches the JSON schema keys (item_0, item_1, ...).
-        if not hasattr(result, "output"):
+        saved_files: List[Tuple[str, str]] = []
+
+        async def call_delegate() -> Tuple[Dict[str, Any], RunUsage]:
+            # A throttled attempt may already have saved files; only the
+            # attempt that succeeds is recorded
+            saved_files.clear()
+            if self._stream:
+                return await self._run_streamed(agent, model, prompt, output_type, task)
+            result = await agent.run(prompt, output_type=output_type, model=model)
+            return result.output, result.usage()
+
+        saved_files_token = _SAVED_FILES.set(saved_files)
+        try:
+            output_mapping, usage = await call_with_backoff(call_delegate)
+        finally:
+            _SAVED_FILES.reset(saved_files_token)
+
+        # The TypedDict output is a plain dict keyed by the schema's item_0,
+        # item_1, ... properties. Read the values by key, in the order of
+        # task.outputs, since the model may emit the keys in any order.
+        try:
+            outputs = tuple(output_mapping[item_key(i)] for i in range(len(task.outputs)))
+        except KeyError as exc:
             raise RuntimeError(
-                f"DelegateRunner.run expected result to have an 'output' attribute, "
-                f"got {type(result).__name__} with attributes {dir(result)}"
-            )
+                f"DelegateRunner.run_async: missing expected key {exc.args[0]!r} in delegate "
+                f"output for task '{task.id}'. Available keys: {list(output_mapping.keys())}"
+            ) from None
 
-        structured_output = result.output
-
-        # For a StructuredDict, the actual values are on `.data`.
-        # Fall back to treating `structured_output` as a mapping if `.data`
-        # is not present, to be defensive against version differences.
-        if hasattr(structured_output, "data"):
-            output_mapping = structured_output.data  # type: ignore[attr-defined]
-        else:
-            if not isinstance(structured_output, dict):
-                raise RuntimeError(
-                    "DelegateRunner.run expected structured_output to have a 'data' "
-                    "attribute or be a dict-like mapping, "
-                    f"got {type(structured_output).__name__}"
-                )
-            output_mapping = structured_output
-
-        # Ensure deterministic ordering that matches the schema: item_0, item_1, ...
-        expected_count = len(task.outputs)
-        expected_keys = [f"item_{i}" for i in range(expected_count)]
-        outputs: List[Any] = []
-
-        for key in expected_keys:
-            if key not in output_mapping:
-                raise RuntimeError(
-                    f"DelegateRunner.run: missing expected key '{key}' in delegate "
-                    f"output for task '{task.id}'. Available keys: {list(output_mapping.keys())}"
-                )
-            outputs.append(output_mapping[key])
-
-        return DelegateRunResult(
+        run_result = DelegateRunResult(
             id=task.id,
-            output_types=[o.type for o in task.outputs],
+            output_types=tuple(o.type for o in task.outputs),
             outputs=outputs,
+            usage=usage,
+        )
+        if self._cache_dir is not None:
+            _write_disk_cache(self._cache_dir, cache_key, run_result, saved_files)
+        return run_result
+
+    async def _run_streamed(
+        self,
+        agent: Agent,
+        model: Optional[RateLimitedModel],
+        prompt: str,
+        output_type: Any,
+        task: Task,
+    ) -> Tuple[Dict[str, Any], RunUsage]:
+        """
+        Run the delegate agent with pydantic-ai's streaming API.
+
+        Progress is reported as each output value arrives, so long outputs are
+        visible before the response completes; the output is validated once
+        the response is complete.
+        """
+        async with agent.run_stream(prompt, output_type=output_type, model=model) as stream:
+            received = 0
+            async for response, _ in stream.stream_responses():
+                count = _partial_output_count(response)
+                if count > received:
+                    received = count
+                    logger.info(
+                        "DelegateRunner: task '%s' is streaming output %d of %d",
+                        task.id,
+                        received,
+                        len(task.outputs),
+                    )
+            return await stream.get_output(), stream.usage()
+
+    def _response_cache_key(self, system_prompt: str, prompt: str, task: Task) -> str:
+        """
+        Build the disk cache key for a delegate call.
+
+        The key covers everything that determines the response: the model, the
+        system prompt, the user prompt (which includes the task id, its prompt
+        and all dependency values) and the task's output schema.
+        """
+        key_material = "\0".join(
+            (self._model, system_prompt, prompt, task.OutputsToSchema())
         )
+        return hashlib.blake2b(key_material.encode("utf-8"), digest_size=16).hexdigest()
 
     def build_prompt_dict(self, delegate_context: DelegateContext, task: Task) -> dict[str, Any]:
         """
-        Build a structured dictionary that will be converted to XML and sent
-        to the delegate agent.
+        Build a structured dictionary describing the prompt sent to the
+        delegate agent.
+
+        run_async sends build_prompt_xml, which writes the same content as
+        format_as_xml of this dictionary without building it; this form is
+        kept for inspection and tests.
 
         It includes:
         - The current task metadata.
-        - For each dependency:
+        - For each dependency, ordered by task id:
           - The dependency task id.
           - Any available run result outputs, with their descriptions and types.
           - The current task's declared input descriptions for that dependency.
+        - The current task's prompt.
+
+        Dependencies are sorted so that identical logical contexts always
+        produce byte-identical prompts, regardless of dependency declaration
+        order, which keeps provider-side prompt caching effective.
+
+        Raises:
+            ValueError: If a dependency's run result does not hold one value
+                per output the dependency declares.
         """
         prompt_dict: Dict[str, Any] = {
             "current_task": {
                 "id": task.id,
-                "description": "This is the task you must now execute.",
             },
             "dependencies": [],
         }
 
         dependencies_list: List[Dict[str, Any]] = []
 
-        # Build a quick lookup from dependency taskId -> list of Input models
-        # as declared on the *current* task.
-        dependency_input_specs: Dict[str, List[Any]] = {}
-        for dep in task.dependsOn:
-            dependency_input_specs.setdefault(dep.taskId, []).extend(dep.inputs)
+        # Lookup from dependency taskId -> list of Input models as declared on
+        # the *current* task (cached on the Task).
+        dependency_input_specs = task.dependency_input_specs
 
-        for dep_task_id, dep_task in delegate_context.dependency_tasks.items():
+        for dep_task_id in sorted(delegate_context.dependency_tasks):
+            dep_task = delegate_context.dependency_tasks[dep_task_id]
             dep_result = delegate_context.dependency_results.get(dep_task_id)
 
             # Map the current task's declared inputs for this dependency, if any.
             input_specs_for_dep = dependency_input_specs.get(dep_task_id, [])
-            mapped_inputs: List[Dict[str, Any]] = []
-            for index, input_spec in enumerate(input_specs_for_dep):
-                mapped_inputs.append(
-                    {
-                        "index": index,
-                        "description": input_spec.description,
-                        "declared_type": input_spec.type,
-                    }
-                )
+            mapped_inputs: List[Dict[str, Any]] = [
+                {
+                    "index": index,
+                    "description": input_spec.description,
+                    "declared_type": input_spec.type,
+                }
+                for index, input_spec in enumerate(input_specs_for_dep)
+            ]
 
             if dep_result is None:
                 # If we have a task but no result, just record that fact for the agent,
@@ -252,42 +580,87 @@ class DelegateRunner:
                 dependencies_list.append(
                     {
                         "task_id": dep_task_id,
-                        "note": "No run result is available for this dependency. It may not have had an output.",
+                        "note": _NO_RESULT_NOTE,
                         "expected_inputs_from_this_dependency": mapped_inputs,
                     }
                 )
                 continue
 
             # Pair each declared output with the corresponding value from the run result.
-            # We rely on DelegateRunResult.__post_init__ to have validated lengths/types.
-            outputs_with_context: List[Dict[str, Any]] = []
-            for index, output_spec in enumerate(dep_task.outputs):
-                value = dep_result.outputs[index] if index < len(dep_result.outputs) else None
-                outputs_with_context.append(
-                    {
-                        "index": index,
-                        "description": output_spec.description,
-                        "declared_type": output_spec.type,
-                        "value": value,
-                    }
-                )
+            # DelegateRunResult.__post_init__ has validated their types.
+            outputs_with_context = _output_records(dep_task, dep_result)
 
             dependencies_list.append(
                 {
                     "task_id": dep_task_id,
-                    "description": "Outputs from a dependency task that you may use as inputs.",
                     "outputs": outputs_with_context,
                     "expected_inputs_from_this_dependency": mapped_inputs,
                 }
             )
 
         prompt_dict["dependencies"] = dependencies_list
+        prompt_dict["current_task_prompt"] = task.prompt
 
         # Log the final prompt_dict for debugging/inspection in a human-readable way.
-        logger.debug(
-            "DelegateRunner.build_prompt_dict for task %s:\n%s",
-            task.id,
-            pformat(prompt_dict),
-        )
+        # pformat walks the whole structure, so only pay for it when DEBUG is enabled.
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "DelegateRunner.build_prompt_dict for task %s:\n%s",
+                task.id,
+                pformat(prompt_dict),
+            )
 
         return prompt_dict
+
+    def build_prompt_xml(self, delegate_context: DelegateContext, task: Task) -> str:
+        """
+        Build the XML user prompt sent to the delegate agent.
+
+        Produces the same XML as format_as_xml(build_prompt_dict(...)), but
+        writes the known tags directly while walking the dependencies instead
+        of building the nested dictionary first and reflecting over it.
+
+        Raises:
+            ValueError: If a dependency's run result does not hold one value
+                per output the dependency declares.
+        """
+        lines: List[str] = ["<current_task>", f"  <id>{_xml_scalar(task.id)}</id>", "</current_task>"]
+
+        dependency_input_specs = task.dependency_input_specs
+        dependency_ids = sorted(delegate_context.dependency_tasks)
+        lines.append("<dependencies>" if dependency_ids else "<dependencies />")
+
+        for dep_task_id in dependency_ids:
+            dep_task = delegate_context.dependency_tasks[dep_task_id]
+            dep_result = delegate_context.dependency_results.get(dep_task_id)
+
+            lines.append("  <item>")
+            lines.append(f"    <task_id>{_xml_scalar(dep_task_id)}</task_id>")
+            if dep_result is None:
+                lines.append(f"    <note>{_NO_RESULT_NOTE}</note>")
+            else:
+                _emit_xml_records(lines, "outputs", _output_records(dep_task, dep_result), "    ")
+            _emit_xml_records(
+                lines,
+                "expected_inputs_from_this_dependency",
+                [
+                    {
+                        "index": index,
+                        "description": input_spec.description,
+                        "declared_type": input_spec.type,
+                    }
+                    for index, input_spec in enumerate(dependency_input_specs.get(dep_task_id, []))
+                ],
+                "    ",
+            )
+            lines.append("  </item>")
+
+        if dependency_ids:
+            lines.append("</dependencies>")
+        lines.append(f"<current_task_prompt>{_xml_scalar(task.prompt)}</current_task_prompt>")
+        prompt = "\n".join(lines)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DelegateRunner.build_prompt_xml for task %s:\n%s", task.id, prompt)
+
+        return prompt
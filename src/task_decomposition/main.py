@@ -1,19 +1,90 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
 import logging
+import queue
+from contextlib import aclosing
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from task_decomposition.cost_calculator import (
+    NANO_USD_PER_USD,
+    calculate_cost,
+    check_input_budget,
+    get_price_row,
+)
+
+# pydantic-ai, the modules built on it and inflect are slow to import, so
+# they are imported inside the functions that use them. Argument parsing
+# (including --help) and importing this module stay fast.
+if TYPE_CHECKING:
+    import inflect
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelMessage
+    from pydantic_ai.models import Model
+    from pydantic_ai.usage import RunUsage
+
+    from task_decomposition.models_schema import TaskPlan
+    from task_decomposition.rate_limiter import RateLimiter
+    from task_decomposition.task_plan_validator import TaskPlanValidator
+
+logger = logging.getLogger(__name__)
+
+# Budgets for the estimated input cost of a single planner call and of a
+# single delegate task call, in USD.
+PLANNER_MAX_INPUT_COST_USD = 0.50
+DELEGATE_MAX_INPUT_COST_USD = 0.50
+
+# Default cap on concurrent delegate calls, to stay within provider rate limits
+DEFAULT_MAX_CONCURRENCY = 8
+
+# run.log in the run output directory is rotated at this size, and written
+# through a buffer of LOG_FILE_BUFFER_BYTES. Records at LOG_FILE_FLUSH_LEVEL
+# or above are flushed immediately, so they reach disk even if the process
+# dies before the buffer fills.
+LOG_FILE_MAX_BYTES = 8 << 20
+LOG_FILE_BUFFER_BYTES = 128 << 10
+LOG_FILE_FLUSH_LEVEL = logging.WARNING
+
+# The planner's user prompt. It is sent unchanged on every attempt so that
+# retries share a byte-identical prefix the provider can serve from its
+# prompt cache; validation feedback is sent as a separate follow-up message.
+_USER_PROMPT = """
+## Role:
+You are an assistant Game Master and Game Source Material Writer for the Pathfinder Remastered Role Playing Game.  You are familiar with the world of Golarion.
+## Intent:
+Generate source material for the Sandpoint Hinterlands
+## Context:
+The players are currently playing a conversion of the old Rise of the Runelords Adventure Path, converted to Pathfinder Remastered.
+They are playing in the Sandpoint Hinterlands.
+Locations of the sandpoint hinterlands:
 
-from pydantic_ai import Agent
+* The Pyre
+* The Three Cormorants
+* The Old Light
+* Tickwood
+* Shank's Wood
 
-from task_decomposition.cost_calculator import calculate_cost
-from task_decomposition.models_schema import TaskPlan
-from task_decomposition.task_plan_builder import DefaultTaskPlanAgentBuilder
-from task_decomposition.task_plan_validator import TaskPlanValidator
-from task_decomposition.task_plan_executor import TaskPlanExecutor
-from task_decomposition.delegate_runner import DelegateRunner, set_run_output_dir, OUTPUT_ROOT
-import inflect
+## Control:
 
-p = inflect.engine()
-logger = logging.getLogger(__name__)
+Must produce 1 document for each location.  documents must be markdown syntax.
+
+## Output:
+Each location must have the following sections in the document:
+
+* Location Overview. Purpose: provide a quick, evocative summary
+* Geography & Environment. Purpose: Ground the location int he world's physical reality
+* Notable Features. Purpose: Identify key areas a party may explore.
+
+Each location's document should be a "chapter" long, written at the quality and detail for commercial sale.
+
+Each location's document must be formatted with markdown saved in a file for each location.
+
+    """
 
 
 def _initialise_run_output_dir() -> Path:
@@ -26,78 +97,362 @@ def _initialise_run_output_dir() -> Path:
 
         output/2025-03-01_14-23-45
     """
+    from task_decomposition.delegate_runner import OUTPUT_ROOT
+
     # Ensure the root output directory exists
     OUTPUT_ROOT.mkdir(parents=True, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     run_dir = OUTPUT_ROOT / timestamp
     run_dir.mkdir(parents=True, exist_ok=True)
-
-    logger.info("Run output directory initialised at: %s", run_dir)
     return run_dir
 
 
-def main():
-    # Basic logging configuration; adjust as needed by the application
-    logging.basicConfig(level=logging.INFO)
+class _BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that writes through a LOG_FILE_BUFFER_BYTES buffer.
 
-    # Initialise per-run output directory and configure the save_file tool
-    run_output_dir = _initialise_run_output_dir()
-    set_run_output_dir(run_output_dir)
+    The stream is not flushed after every record; the buffer is written out
+    when it fills, on rollover, when the handler is closed and, like
+    MemoryHandler's flushLevel, as soon as a record at LOG_FILE_FLUSH_LEVEL or
+    above is written.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if record.levelno >= LOG_FILE_FLUSH_LEVEL:
+            super().flush()
+
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=LOG_FILE_BUFFER_BYTES,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
 
-    # Build the TaskPlan-producing agent via the abstraction
-    builder = DefaultTaskPlanAgentBuilder()
-    agent: Agent[TaskPlan] = builder.build_agent()
+    def flush(self) -> None:
+        # Called by StreamHandler.emit after every record; emit decides instead
+        pass
 
-    logger.info("Using LLM to get task plan...")
 
-    validator = TaskPlanValidator()
-    max_attempts = 5
-    last_plan: TaskPlan | None = None
+def _configure_logging(run_output_dir: Path) -> QueueListener:
+    """
+    Send log records through a queue to handlers on a background thread.
 
-    for attempt in range(1, max_attempts + 1):
-        logger.info("Attempt %d to generate TaskPlan", attempt)
+    Records are written to stderr and to run.log in the run output directory,
+    so logging calls only enqueue a record and never wait on I/O. The returned
+    listener must be passed to _stop_logging before exiting.
+    """
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    formatter = logging.Formatter(logging.BASIC_FORMAT)
+    handlers: list[logging.Handler] = [
+        logging.StreamHandler(),
+        _BufferedRotatingFileHandler(
+            run_output_dir / "run.log",
+            maxBytes=LOG_FILE_MAX_BYTES,
+            backupCount=3,
+            encoding="utf-8",
+        ),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def _stop_logging(listener: QueueListener) -> None:
+    """
+    Write out every queued record and close the handlers, flushing run.log.
+    """
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
 
-        result = agent.run_sync(
-            """
-## Role:
-You are an assistant Game Master and Game Source Material Writer for the Pathfinder Remastered Role Playing Game.  You are familiar with the world of Golarion.
-## Intent:
-Generate source material for the Sandpoint Hinterlands
-## Context:
-The players are currently playing a conversion of the old Rise of the Runelords Adventure Path, converted to Pathfinder Remastered.
-They are playing in the Sandpoint Hinterlands.
-Locations of the sandpoint hinterlands:
 
-* The Pyre
-* The Three Cormorants
-* The Old Light
-* Tickwood
-* Shank's Wood
+@functools.cache
+def _inflect_engine() -> inflect.engine:
+    import inflect
 
-## Control:
+    return inflect.engine()
 
-Must produce 1 document for each location.  documents must be markdown syntax.
 
-## Output:
-Each location must have the following sections in the document:
+def _plural(word: str, count: int) -> str:
+    """
+    Return word pluralised for count, for example "task" or "tasks".
+    """
+    return _inflect_engine().plural(word, count)
 
-* Location Overview. Purpose: provide a quick, evocative summary
-* Geography & Environment. Purpose: Ground the location int he world's physical reality
-* Notable Features. Purpose: Identify key areas a party may explore.
 
-Each location's document should be a "chapter" long, written at the quality and detail for commercial sale.
+def _adaptation_prompt(plan: TaskPlan, user_prompt: str) -> str:
+    """
+    Build a planner prompt asking for a cached TaskPlan to be adapted to
+    user_prompt, which is similar to the prompt the plan was made for.
 
-Each location's document must be formatted with markdown saved in a file for each location.
+    user_prompt comes first, so the prompt shares its prefix with a normal
+    planner call.
+    """
+    return (
+        f"{user_prompt}\n"
+        "## Reference TaskPlan:\n"
+        "The TaskPlan below was produced for a very similar request. Return it "
+        "adapted to the request above: keep its structure, and change only the "
+        "objective, tasks, prompts and outputs that the request above does not "
+        "share with it.\n"
+        f"{plan.model_dump_json()}\n"
+    )
+
+
+def _format_plan(plan: TaskPlan) -> str:
+    """
+    Describe a TaskPlan as one block of text: its objective, then each task's
+    prompt, dependencies with their inputs, and outputs.
+    """
+    lines = [
+        f"Objective: {plan.objective}",
+        "",
+        f"Requires {len(plan.tasks)} {_plural('task', len(plan.tasks))}",
+    ]
+    append = lines.append
+    for task in plan.tasks:
+        append(f"Task: {task.id}")
+        append("Prompt:")
+        append("```")
+        append(task.prompt)
+        append("```")
+        for dep in task.dependsOn:
+            append(f"Depends on: {dep.taskId}")
+            for i in dep.inputs:
+                append(f"Input ({i.type}): {i.description}")
+        for output in task.outputs:
+            append(f"Output ({output.type}): {output.description}")
+        append("")
+    return "\n".join(lines)
+
+
+def _positive_int(value: str) -> int:
+    """
+    argparse type for options that must be a whole number of at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def _priced_model(value: str) -> str:
+    """
+    argparse type for --model. Only models with a known price are accepted,
+    since every planner and delegate call is checked against a cost budget.
+    """
+    try:
+        get_price_row(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from None
+    return value
+
+
+def _parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Decompose an objective into a task plan and execute it."
+    )
+    parser.add_argument(
+        "--model",
+        type=_priced_model,
+        default="openai:gpt-5.1",
+        help=(
+            "Model used by both the planner and the delegates; it must have a known "
+            "price in cost_calculator.PRICES (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream delegate responses and log progress as each output arrives",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the on-disk cache of task plans and delegate responses in output/.cache",
+    )
+    parser.add_argument(
+        "--similar-plan-threshold",
+        type=float,
+        default=None,
+        help=(
+            "Adapt a cached task plan whose user prompt has at least this word-level "
+            "cosine similarity (0-1) to the current one, instead of planning from "
+            "scratch. Off by default"
+        ),
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=_positive_int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="Maximum number of delegate calls in flight at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=_positive_int,
+        default=None,
+        help=(
+            "Limit on model requests per minute across the planner and delegates, "
+            "counting every request of a run (tool calls and retries included). "
+            "Unlimited by default"
+        ),
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=_positive_int,
+        default=None,
+        help=(
+            "Limit on estimated input tokens per minute across the planner and delegates, "
+            "counting the whole conversation sent with each request. Unlimited by default"
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+class _PlanRejected(Exception):
+    """
+    Raised to abandon a planner stream whose TaskPlan was rejected.
+
+    Carries the usage of the stream up to the rejection, since the stream is
+    gone by the time the exception is caught.
+    """
+
+    def __init__(self, reason: str, usage: RunUsage) -> None:
+        super().__init__(reason)
+        self.usage = usage
 
+
+async def _stream_plan(
+    agent: Agent[TaskPlan],
+    validator: TaskPlanValidator,
+    prompt: str,
+    message_history: list[ModelMessage] | None,
+    model: Model | None = None,
+) -> tuple[TaskPlan | None, str | None, RunUsage, list[ModelMessage]]:
+    """
+    Stream one planner response, checking its tasks as they arrive.
+
+    The stream is abandoned as soon as the partial TaskPlan fails
+    TaskPlanValidator.validate_partial, so no more output tokens are spent on
+    a plan that will be rejected anyway.
+
+    model overrides the agent's model for this run, for example with a
+    RateLimitedModel.
+
+    Returns:
+        The TaskPlan, or None with the reason it was rejected, followed by
+        the usage and messages of the run.
     """
+    from pydantic import ValidationError
+
+    try:
+        async with agent.run_stream(
+            prompt, message_history=message_history, model=model
+        ) as stream:
+            try:
+                async with aclosing(stream.stream_output()) as partial_plans:
+                    async for partial_plan in partial_plans:
+                        if not validator.validate_partial(partial_plan.tasks):
+                            # Leaving run_stream normally would read the rest of
+                            # the response; raising closes it instead
+                            raise _PlanRejected(
+                                validator.last_error or "it is invalid", stream.usage()
+                            )
+                plan = await stream.get_output()
+            except ValidationError as exc:
+                raise _PlanRejected(
+                    f"it did not match the TaskPlan schema: {exc}", stream.usage()
+                ) from exc
+            return plan, None, stream.usage(), stream.all_messages()
+    except _PlanRejected as exc:
+        return None, str(exc), exc.usage, []
+
+
+async def _generate_plan(
+    agent: Agent[TaskPlan],
+    validator: TaskPlanValidator,
+    model: str,
+    rate_limiter: Optional[RateLimiter] = None,
+    user_prompt: str = _USER_PROMPT,
+    system_prompt: str = "",
+) -> TaskPlan:
+    """
+    Ask the planner agent for a TaskPlan, retrying until one passes validation.
+
+    Calls throttled by the provider are retried with backoff and do not count
+    as attempts. Before each attempt, the estimated input cost of everything
+    sent with it (the system prompt, or the conversation kept from earlier
+    attempts, plus the next message) is checked against the planner budget.
+
+    Raises:
+        BudgetExceededError: If an attempt is estimated to exceed the planner budget.
+        RuntimeError: If no valid TaskPlan is produced within the allowed attempts.
+    """
+    from task_decomposition.cost_calculator import messages_text
+    from task_decomposition.rate_limiter import RateLimitedModel, call_with_backoff
+
+    logger.info("Using LLM to get task plan...")
+
+    # Each planner request, output retries included, goes through the limiter
+    limited_model = (
+        RateLimitedModel(agent.model, rate_limiter) if rate_limiter is not None else None
+    )
+
+    max_attempts = 5
+    last_plan: TaskPlan | None = None
+    # Conversation so far and the next message to send. After a rejected plan
+    # the conversation is kept and the validation error becomes the next message.
+    message_history: list[ModelMessage] | None = None
+    request = user_prompt
+    next_prompt = request
+
+    for attempt in range(1, max_attempts + 1):
+        logger.info("Attempt %d to generate TaskPlan", attempt)
+
+        # Refuse to send an attempt that is estimated to blow the planner
+        # budget. A kept conversation already starts with the system prompt.
+        context_text = messages_text(message_history) if message_history else system_prompt
+        estimated_nano_usd = check_input_budget(
+            model, PLANNER_MAX_INPUT_COST_USD, context_text, next_prompt
+        )
+        logger.info(
+            "Estimated planner input cost of attempt %d: $%.7f",
+            attempt,
+            estimated_nano_usd / NANO_USD_PER_USD,
+        )
+
+        plan, rejection, usage, messages = await call_with_backoff(
+            lambda: _stream_plan(agent, validator, next_prompt, message_history, limited_model)
         )
 
-        usage = result.usage()
-        logger.info(calculate_cost(usage))
-        logger.info("Took %s %s", usage.requests, p.plural("try", usage.requests))
+        logger.info(calculate_cost(usage, model=model))
+        logger.info("Took %s %s", usage.requests, _plural("try", usage.requests))
+
+        if plan is None:
+            # The response was abandoned before it was complete, so it is not
+            # kept in the conversation; the same request is sent again with
+            # the reason appended.
+            logger.warning(
+                "TaskPlan was rejected while streaming on attempt %d; retrying if attempts remain",
+                attempt,
+            )
+            next_prompt = f"{request}\n\nAn earlier attempt was rejected because {rejection}."
+            continue
 
-        plan: TaskPlan = result.output
         last_plan = plan
 
         # Validate the generated TaskPlan before using it
@@ -109,6 +464,12 @@ Each location's document must be formatted with markdown saved in a file for eac
                 "Generated TaskPlan failed validation on attempt %d; retrying if attempts remain",
                 attempt,
             )
+            message_history = messages
+            request = (
+                f"The TaskPlan you returned is invalid: {validator.last_error}. "
+                "Return a corrected TaskPlan for the same objective."
+            )
+            next_prompt = request
     else:
         # If we exit the loop without breaking, all attempts failed
         logger.error(
@@ -118,44 +479,105 @@ Each location's document must be formatted with markdown saved in a file for eac
             f"Generated TaskPlan is invalid after {max_attempts} attempts according to TaskPlanValidator"
         )
 
-    # At this point, `plan` is guaranteed to be the last valid TaskPlan
-    plan = last_plan
-    if plan is None:
+    # At this point, `last_plan` is guaranteed to be the last valid TaskPlan
+    if last_plan is None:
         raise RuntimeError("No TaskPlan was generated")
+    return last_plan
 
-    logger.info("Objective: %s", plan.objective)
-    logger.info("")
-    logger.info("Requires %s %s", len(plan.tasks), p.plural("task", len(plan.tasks)))
-    for task in plan.tasks:
-        logger.info("Task: %s", task.id)
-        logger.info("Prompt:")
-        logger.info("```")
-        logger.info("%s", task.prompt)
-        logger.info("```")
-        for dep in task.dependsOn:
-            logger.info("Depends on: %s", dep.taskId)
-            for i in dep.inputs:
-                logger.info("Input (%s): %s", i.type, i.description)
-        for output in task.outputs:
-            logger.info("Output (%s): %s", output.type, output.description)
-        logger.info("")
+
+def main(argv: Optional[Sequence[str]] = None):
+    args = _parse_args(argv)
+
+    # Initialise per-run output directory, which also holds the run's log
+    run_output_dir = _initialise_run_output_dir()
+    listener = _configure_logging(run_output_dir)
+    logger.info("Run output directory initialised at: %s", run_output_dir)
+    try:
+        asyncio.run(main_async(args, run_output_dir))
+    finally:
+        # Also reached on KeyboardInterrupt, so run.log is never left unflushed
+        _stop_logging(listener)
+
+
+async def main_async(args: argparse.Namespace, run_output_dir: Path) -> None:
+    from task_decomposition.delegate_runner import OUTPUT_ROOT, DelegateRunner, set_run_output_dir
+    from task_decomposition.plan_cache import PlanCache
+    from task_decomposition.rate_limiter import RateLimiter
+    from task_decomposition.task_plan_builder import DefaultTaskPlanAgentBuilder
+    from task_decomposition.task_plan_executor import TaskPlanExecutor
+    from task_decomposition.task_plan_validator import TaskPlanValidator
+
+    # Configure the save_file tool to write into this run's directory
+    set_run_output_dir(run_output_dir)
+
+    rate_limiter = RateLimiter(rpm=args.requests_per_minute, tpm=args.tokens_per_minute)
+
+    builder = DefaultTaskPlanAgentBuilder(model=args.model)
+
+    plan_cache = (
+        None
+        if args.no_cache
+        else PlanCache(OUTPUT_ROOT / ".cache" / "plans", args.similar_plan_threshold)
+    )
+    # A cached plan is only used if it can still be read and still passes
+    # validation (the validator may have become stricter since it was
+    # stored); otherwise the cache evicts it and a new plan is generated.
+    validator = TaskPlanValidator()
+    cached = (
+        plan_cache.get(args.model, builder.system_prompt, _USER_PROMPT, validator.validate)
+        if plan_cache is not None
+        else None
+    )
+
+    if cached is not None and cached.similarity >= 1.0:
+        logger.info("Using cached TaskPlan; skipping the planner LLM call")
+        plan = cached.plan
+    else:
+        # Build the TaskPlan-producing agent via the abstraction; an exact
+        # cache hit never needs it
+        agent: Agent[TaskPlan] = builder.build_agent()
+        if cached is not None:
+            # A plan for a similar prompt is adapted rather than planned from scratch
+            logger.info("Adapting the cached TaskPlan for a similar prompt")
+            user_prompt = _adaptation_prompt(cached.plan, _USER_PROMPT)
+        else:
+            user_prompt = _USER_PROMPT
+        plan = await _generate_plan(
+            agent, validator, args.model, rate_limiter, user_prompt, builder.system_prompt
+        )
+        if plan_cache is not None:
+            plan_cache.put(args.model, builder.system_prompt, _USER_PROMPT, plan)
+
+    logger.info("%s", _format_plan(plan))
 
     # Execute the validated TaskPlan using TaskPlanExecutor and DelegateRunner
     logger.info("Executing TaskPlan with %s", TaskPlanExecutor.__name__)
-    delegate_runner = DelegateRunner()
-    executor = TaskPlanExecutor(plan, delegate_runner)
-    executor.execute()
+    delegate_runner = DelegateRunner(
+        model=args.model,
+        max_input_cost_usd=DELEGATE_MAX_INPUT_COST_USD,
+        stream=args.stream,
+        cache_dir=None if args.no_cache else OUTPUT_ROOT / ".cache",
+        rate_limiter=rate_limiter,
+    )
+    executor = TaskPlanExecutor(plan, delegate_runner, max_concurrency=args.max_concurrency)
+    await executor.execute_async()
 
     # Log a brief summary of execution results
     logger.info(
         "Execution complete. Collected results for %s %s.",
         len(executor.results),
-        p.plural("task", len(executor.results)),
+        _plural("task", len(executor.results)),
     )
     for task_id, result in executor.results.items():
         logger.info("Result for task '%s':", task_id)
         logger.info("  Output types: %s", result.output_types)
         logger.info("  Outputs: %s", result.outputs)
+    logger.info("Task execution %s", calculate_cost(executor.usage, model=args.model))
+    logger.info(
+        "Task execution used %d input tokens, %d of them served from the prompt cache",
+        executor.usage.input_tokens,
+        executor.usage.cache_read_tokens,
+    )
 
 
 if __name__ == "__main__":
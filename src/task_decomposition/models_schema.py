@@ -1,12 +1,39 @@
-from typing import List, Literal, Dict, Any
+import sys
+from functools import cached_property, lru_cache
+from types import MappingProxyType
+from typing import Final, Literal, Dict, Any, Mapping, Sequence, Tuple, Union
 
-from pydantic import BaseModel, Field
-from pydantic_ai import StructuredDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic_core import to_json
 
 DataType = Literal["string", "integer", "float", "boolean"]
 
+# Map our DataType to JSON Schema primitive types
+_TYPE_MAP: Final[Mapping[DataType, str]] = MappingProxyType(
+    {
+        "string": "string",
+        "integer": "integer",
+        "float": "number",
+        "boolean": "boolean",
+    }
+)
+
+# Interned property names for the first inputs/outputs of a schema, so every
+# schema and output lookup shares the same key strings instead of formatting
+# new ones per task.
+_ITEM_KEYS: Tuple[str, ...] = tuple(sys.intern(f"item_{i}") for i in range(64))
+
+
+def item_key(index: int) -> str:
+    """
+    Return the schema property name for the input or output at index.
+    """
+    return _ITEM_KEYS[index] if index < len(_ITEM_KEYS) else f"item_{index}"
+
 
 class Input(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     description: str = Field(
         ...,
         description="A description of the input which helps the prompted LLM understand what's is being input",
@@ -18,6 +45,8 @@ class Input(BaseModel):
 
 
 class Output(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     description: str = Field(
         ...,
         description="A description of the input which helps the prompted LLM understand what's required to output"
@@ -28,16 +57,63 @@ class Output(BaseModel):
     )
 
 
+def _items_to_schema(items: Sequence[Union[Input, Output]]) -> str:
+    """
+    Build the JSON Schema string for an object with one required property per
+    item, named item_0, item_1, ..., item_n-1.
+    """
+    return _schema_for_items(tuple((item.type, item.description) for item in items))
+
+
+@lru_cache(maxsize=256)
+def _schema_for_items(items: Tuple[Tuple[DataType, str], ...]) -> str:
+    """
+    Build and memoize the schema string for (type, description) pairs.
+
+    Tasks are serialised for every delegate call and every dependent that
+    reads them, so identical output lists share one cached string.
+    """
+    properties: Dict[str, Any] = {
+        item_key(index): {"type": _TYPE_MAP[type_], "description": description}
+        for index, (type_, description) in enumerate(items)
+    }
+    schema: Dict[str, Any] = {"type": "object", "properties": properties}
+
+    # Every property is required; only include "required" if there are any
+    if properties:
+        schema["required"] = list(properties)
+
+    return to_json(schema).decode()
+
+
 class Dependency(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     taskId: str = Field(
         ...,
         description="The id of the task for this dependency. Will fail if none of the tasks have this id.",
     )
-    inputs: List[Input] = Field(
-        default_factory=list,
+    inputs: Tuple[Input, ...] = Field(
+        default_factory=tuple,
         description="A list of inputs required by the dependency. Will fail if the dependency task's outputs don't match these inputs."
     )
 
+    @field_validator("taskId")
+    @classmethod
+    def _intern_task_id(cls, value: str) -> str:
+        """
+        Intern the id, so it is the same object as the referenced Task.id.
+        """
+        return sys.intern(value)
+
+    @cached_property
+    def input_types(self) -> Tuple[DataType, ...]:
+        """
+        The type of each input, in order. Compared as a whole against the
+        referenced task's output_types.
+        """
+        return tuple(item.type for item in self.inputs)
+
     def InputsToSchema(self) -> str:
         """
         Convert this Dependency's inputs into a JSON Schema string.
@@ -47,38 +123,12 @@ class Dependency(BaseModel):
         - All properties are required.
         - Input.type is mapped to the appropriate JSON Schema "type".
         """
-        import json
-
-        type_map: Dict[DataType, str] = {
-            "string": "string",
-            "integer": "integer",
-            "float": "number",
-            "boolean": "boolean",
-        }
-
-        properties: Dict[str, Dict[str, Any]] = {}
-        required: List[str] = []
-
-        for index, input_ in enumerate(self.inputs):
-            key = f"item_{index}"
-            properties[key] = {
-                "type": type_map[input_.type],
-                "description": input_.description,
-            }
-            required.append(key)
-
-        schema: Dict[str, Any] = {
-            "type": "object",
-            "properties": properties,
-        }
-
-        if required:
-            schema["required"] = required
-
-        return json.dumps(schema)
+        return _items_to_schema(self.inputs)
 
 
 class Task(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: str = Field(
         ...,
         description="A unique identifier for the task, referred to by dependencies."
@@ -87,15 +137,51 @@ class Task(BaseModel):
         ...,
         description="The LLM prompt for the agent to run. Must follow the format: Role:, Intent:, Context:, Constraints:, Output:, must explain the dependencies and outputs."
     )
-    dependsOn: List[Dependency] = Field(
-        default_factory=list,
+    dependsOn: Tuple[Dependency, ...] = Field(
+        default_factory=tuple,
         description="A list of tasks this task depends on and their outputs. Used to build a dependency tree and ensures tasks are ran in the correct order of the graph"
     )
-    outputs: List[Output] = Field(
-        default_factory=list,
+    outputs: Tuple[Output, ...] = Field(
+        default_factory=tuple,
         description="A list of output properties output by this task. Empty if this task doesn't have any output (ie: calls a tool). Inputs of tasks must match this task's output."
     )
 
+    @field_validator("id")
+    @classmethod
+    def _intern_id(cls, value: str) -> str:
+        """
+        Intern the id when the plan is ingested. Task ids key every lookup in
+        the validator, graph builder and executor, and interned keys compare
+        by identity instead of by content.
+        """
+        return sys.intern(value)
+
+    @cached_property
+    def output_types(self) -> Tuple[DataType, ...]:
+        """
+        The type of each output, in order. Compared as a whole against the
+        input_types of every dependency on this task.
+        """
+        return tuple(item.type for item in self.outputs)
+
+    @cached_property
+    def dependency_input_specs(self) -> Dict[str, Tuple[Input, ...]]:
+        """
+        Map each dependency taskId to the inputs this task declares for it.
+
+        Computed once per Task and cached, since the dependencies of a task do
+        not change while it is being executed or retried.
+        """
+        specs: Dict[str, Tuple[Input, ...]] = {dep.taskId: dep.inputs for dep in self.dependsOn}
+        if len(specs) == len(self.dependsOn):
+            return specs
+
+        # A dependency is declared more than once; concatenate its inputs
+        specs = {}
+        for dep in self.dependsOn:
+            specs[dep.taskId] = specs.get(dep.taskId, ()) + dep.inputs
+        return specs
+
     def OutputsToSchema(self) -> str:
         """
         Convert this Task's outputs into a JSON Schema string.
@@ -105,45 +191,17 @@ class Task(BaseModel):
         - All properties are required.
         - Output.type is mapped to the appropriate JSON Schema "type".
         """
-        import json
-
-        # Map our DataType to JSON Schema primitive types
-        type_map: Dict[DataType, str] = {
-            "string": "string",
-            "integer": "integer",
-            "float": "number",
-            "boolean": "boolean",
-        }
-
-        properties: Dict[str, Dict[str, Any]] = {}
-        required: List[str] = []
-
-        for index, output in enumerate(self.outputs):
-            key = f"item_{index}"
-            properties[key] = {
-                "type": type_map[output.type],
-                "description": output.description,
-            }
-            required.append(key)
-
-        schema: Dict[str, Any] = {
-            "type": "object",
-            "properties": properties,
-        }
-
-        # Only include "required" if there are any properties
-        if required:
-            schema["required"] = required
-
-        return json.dumps(schema)
+        return _items_to_schema(self.outputs)
 
 
 class TaskPlan(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     objective: str = Field(
         ...,
         description="The overall objective of the task set"
     )
-    tasks: List[Task] = Field(
-        default_factory=list,
+    tasks: Tuple[Task, ...] = Field(
+        default_factory=tuple,
         description="The tasks which must be complete to complete the overall task. Will form a graph of prompts executed by agents and fed into dependant tasks."
     )
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional
+
+from pydantic_core import from_json, to_json
+
+from task_decomposition.models_schema import TaskPlan
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class CachedPlan(NamedTuple):
+    """
+    A TaskPlan found in the PlanCache.
+
+    Attributes:
+        key: The cache key the plan is stored under.
+        plan: The cached TaskPlan.
+        similarity: Cosine similarity between the requested user prompt and
+            the one the plan was generated for; 1.0 for an exact match.
+    """
+
+    key: str
+    plan: TaskPlan
+    similarity: float
+
+
+class PlanCache:
+    """
+    On-disk cache of validated TaskPlans, keyed by the planner inputs.
+
+    Generating a TaskPlan is the slowest and most expensive step of a run.
+    When the model, planner system prompt and user prompt are unchanged, the
+    previously validated plan is loaded from disk instead.
+
+    With a similarity_threshold, a user prompt that differs only slightly
+    from a cached one (for the same model and system prompt) also reuses that
+    plan. Similarity is the cosine of the prompts' word-count vectors, which
+    needs no embedding model but only recognises near-identical wording.
+    """
+
+    def __init__(self, cache_dir: Path, similarity_threshold: Optional[float] = None) -> None:
+        self._cache_dir = cache_dir
+        self._similarity_threshold = similarity_threshold
+
+    @staticmethod
+    def key(model: str, system_prompt: str, user_prompt: str) -> str:
+        """
+        Build the cache key for a planner call from everything that determines its plan.
+        """
+        key_material = "\0".join((model, system_prompt, user_prompt))
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        is_valid: Optional[Callable[[TaskPlan], bool]] = None,
+    ) -> Optional[CachedPlan]:
+        """
+        Return the cached plan for these planner inputs, or None if there is none.
+
+        An exact match is preferred. Otherwise, if a similarity threshold is
+        set, the most similar cached user prompt for the same model and system
+        prompt is used when it reaches the threshold.
+
+        A stored plan that cannot be read back, or that is rejected by
+        is_valid (for example because the validator has become stricter since
+        it was stored), is evicted and treated as a miss.
+        """
+        key = self.key(model, system_prompt, user_prompt)
+        plan = self._load(key, is_valid)
+        if plan is not None:
+            return CachedPlan(key, plan, 1.0)
+
+        if self._similarity_threshold is None:
+            return None
+
+        scope = _scope(model, system_prompt)
+        words = _word_counts(user_prompt)
+        best_key: Optional[str] = None
+        best_similarity = 0.0
+        for entry_key, entry in self._read_index().items():
+            if entry["scope"] != scope:
+                continue
+            similarity = _cosine(words, _word_counts(entry["user_prompt"]))
+            if similarity > best_similarity:
+                best_key, best_similarity = entry_key, similarity
+
+        if best_key is None or best_similarity < self._similarity_threshold:
+            return None
+        plan = self._load(best_key, is_valid)
+        if plan is None:
+            return None
+        logger.info("Found a cached TaskPlan for a similar prompt (similarity %.3f)", best_similarity)
+        return CachedPlan(best_key, plan, best_similarity)
+
+    def put(self, model: str, system_prompt: str, user_prompt: str, plan: TaskPlan) -> str:
+        """
+        Store a validated TaskPlan for these planner inputs and return its key.
+        """
+        key = self.key(model, system_prompt, user_prompt)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._path(key), to_json(plan))
+
+        index = self._read_index()
+        index[key] = {"scope": _scope(model, system_prompt), "user_prompt": user_prompt}
+        _write_atomic(self._index_path(), to_json(index))
+
+        logger.info("Cached TaskPlan as %s", self._path(key))
+        return key
+
+    def evict(self, key: str) -> None:
+        """
+        Remove the plan stored under key, for example after it failed validation.
+        """
+        self._path(key).unlink(missing_ok=True)
+        index = self._read_index()
+        if index.pop(key, None) is not None:
+            _write_atomic(self._index_path(), to_json(index))
+        logger.info("Evicted cached TaskPlan %s", key)
+
+    def _load(
+        self, key: str, is_valid: Optional[Callable[[TaskPlan], bool]] = None
+    ) -> Optional[TaskPlan]:
+        """
+        Load the plan stored under key, or None if there is none.
+
+        A plan that cannot be read back (truncated, corrupt or stored under an
+        older TaskPlan schema) or that fails is_valid is evicted and treated
+        as a miss, so the planner runs again instead of the run failing.
+        """
+        path = self._path(key)
+        try:
+            plan = TaskPlan.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except ValueError as exc:
+            # pydantic's ValidationError is a ValueError
+            logger.warning("Discarding unreadable cached TaskPlan %s: %s", path, exc)
+            self.evict(key)
+            return None
+
+        if is_valid is not None and not is_valid(plan):
+            logger.warning("Discarding cached TaskPlan %s that failed validation", path)
+            self.evict(key)
+            return None
+        return plan
+
+    def _read_index(self) -> Dict[str, Dict[str, str]]:
+        """
+        Load the index of cached user prompts, or an empty one if there is none.
+
+        An unreadable or malformed index is removed and rebuilt from scratch
+        by later puts. The plans themselves are kept, so exact matches still
+        hit; only similar-prompt lookups lose the older entries.
+        """
+        path = self._index_path()
+        try:
+            index = from_json(path.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except ValueError as exc:
+            logger.warning("Discarding unreadable TaskPlan cache index %s: %s", path, exc)
+            path.unlink(missing_ok=True)
+            return {}
+
+        if not isinstance(index, dict) or not all(
+            isinstance(entry, dict)
+            and isinstance(entry.get("scope"), str)
+            and isinstance(entry.get("user_prompt"), str)
+            for entry in index.values()
+        ):
+            logger.warning("Discarding malformed TaskPlan cache index %s", path)
+            path.unlink(missing_ok=True)
+            return {}
+        return index
+
+    def _path(self, key: str) -> Path:
+        return self._cache_dir / f"{key}.json"
+
+    def _index_path(self) -> Path:
+        return self._cache_dir / "index.json"
+
+
+def _scope(model: str, system_prompt: str) -> str:
+    # Plans are only reused across user prompts for the same model and system prompt
+    return hashlib.sha256(f"{model}\0{system_prompt}".encode("utf-8")).hexdigest()
+
+
+def _word_counts(text: str) -> Counter[str]:
+    return Counter(_WORD_RE.findall(text.lower()))
+
+
+def _cosine(a: Counter[str], b: Counter[str]) -> float:
+    dot = sum(count * b[word] for word, count in a.items())
+    if not dot:
+        return 0.0
+    norm_a = math.sqrt(sum(count * count for count in a.values()))
+    norm_b = math.sqrt(sum(count * count for count in b.values()))
+    return dot / (norm_a * norm_b)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """
+    Write data to a temporary file and rename it into place, so a concurrent
+    reader never sees a partially written file.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_name, path)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+from typing import Optional
+
+from pydantic_ai.settings import ModelSettings
+
+# Provider prefixes of pydantic-ai model names that use OpenAI's API
+_OPENAI_PROVIDERS = frozenset({"openai", "openai-chat", "openai-responses"})
+
+
+@functools.lru_cache(maxsize=16)
+def prompt_cache_key(system_prompt: str) -> str:
+    """
+    Return a short, stable key identifying a system prompt.
+    """
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:32]
+
+
+def prompt_cache_settings(model: str, system_prompt: str) -> Optional[ModelSettings]:
+    """
+    Return model settings that let the provider reuse its cache of the static
+    prompt prefix (the system prompt and tool definitions) across runs.
+
+    - OpenAI caches long prompt prefixes implicitly. Sending the same
+      `prompt_cache_key` with every request that shares the system prompt
+      routes them to the same cache, which raises the hit rate.
+    - Anthropic only caches content explicitly marked with
+      `cache_control: ephemeral`, so cache breakpoints are placed on the
+      system prompt and on the tool definitions.
+
+    Returns None for other providers, which are called without extra settings.
+    """
+    provider = model.split(":", 1)[0] if ":" in model else ""
+    if provider == "anthropic":
+        return ModelSettings(  # type: ignore[typeddict-unknown-key]
+            anthropic_cache_instructions=True,
+            anthropic_cache_tool_definitions=True,
+        )
+    if provider in _OPENAI_PROVIDERS:
+        return ModelSettings(extra_body={"prompt_cache_key": prompt_cache_key(system_prompt)})
+    return None
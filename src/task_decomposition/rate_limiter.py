@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+from pydantic_core import to_json
+
+from task_decomposition.cost_calculator import estimate_tokens, messages_text
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status returned by providers when a request is throttled
+TOO_MANY_REQUESTS = 429
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute.
+
+    Each bucket holds up to a minute's allowance and refills continuously, so
+    short bursts are allowed while the sustained rate stays under the limit.
+    A limit of None disables that bucket.
+
+    Raises:
+        ValueError: If a limit is zero or negative.
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None) -> None:
+        for name, limit in (("rpm", rpm), ("tpm", tpm)):
+            if limit is not None and limit <= 0:
+                raise ValueError(f"RateLimiter {name} must be positive or None, got {limit}")
+        self._rpm = rpm
+        self._tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+        # Held while waiting for capacity, so waiters are served in order
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait until one request using an estimated number of tokens may be sent.
+
+        A request estimated at more than the whole tokens-per-minute limit
+        waits for a full bucket rather than forever.
+        """
+        if self._tpm is not None:
+            tokens = min(tokens, self._tpm)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = max(
+                    self._wait_for(self._requests, 1, self._rpm),
+                    self._wait_for(self._tokens, tokens, self._tpm),
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self._rpm is not None:
+                self._requests -= 1
+            if self._tpm is not None:
+                self._tokens -= tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self._rpm is not None:
+            self._requests = min(float(self._rpm), self._requests + elapsed * self._rpm / 60)
+        if self._tpm is not None:
+            self._tokens = min(float(self._tpm), self._tokens + elapsed * self._tpm / 60)
+
+    @staticmethod
+    def _wait_for(available: float, needed: int, per_minute: Optional[int]) -> float:
+        """
+        Return the seconds until a bucket holds needed units, 0 if it already does.
+        """
+        if per_minute is None or available >= needed:
+            return 0.0
+        return (needed - available) * 60 / per_minute
+
+
+class RateLimitedModel(WrapperModel):
+    """
+    Model that acquires a RateLimiter before every request it sends.
+
+    An agent run can send several requests: one per tool call round-trip and
+    one per output retry. Wrapping the model throttles each of them, with the
+    tokens estimated from the whole conversation sent in that request plus
+    the tool definitions, rather than once per run from the first prompt.
+    """
+
+    def __init__(self, wrapped: Model | str, limiter: RateLimiter) -> None:
+        super().__init__(wrapped)
+        self.limiter = limiter
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        await self.limiter.acquire(_estimate_request_tokens(messages, model_request_parameters))
+        return await super().request(messages, model_settings, model_request_parameters)
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context: Any = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        await self.limiter.acquire(_estimate_request_tokens(messages, model_request_parameters))
+        async with super().request_stream(
+            messages, model_settings, model_request_parameters, run_context
+        ) as response_stream:
+            yield response_stream
+
+
+def _estimate_request_tokens(
+    messages: list[ModelMessage], model_request_parameters: ModelRequestParameters
+) -> int:
+    """
+    Estimate the input tokens of one model request: the conversation so far
+    and the definitions of the tools the model may call, output tools included.
+    """
+    tool_defs = [
+        *model_request_parameters.function_tools,
+        *model_request_parameters.output_tools,
+    ]
+    tools_json = to_json(
+        [(tool.name, tool.description, tool.parameters_json_schema) for tool in tool_defs]
+    )
+    return estimate_tokens(messages_text(messages)) + estimate_tokens(tools_json.decode())
+
+
+def _retry_after(exc: ModelHTTPError) -> Optional[float]:
+    """
+    Return the delay in seconds requested by the provider for a throttled call.
+
+    ModelHTTPError does not carry the response headers, but the provider SDK
+    error it was raised from usually does (for example openai.RateLimitError).
+    """
+    response = getattr(exc.__cause__, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        # An HTTP-date Retry-After is not supported; fall back to backoff
+        pass
+    return None
+
+
+async def call_with_backoff(
+    call: Callable[[], Awaitable[T]],
+    *,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """
+    Await call(), retrying with exponential backoff while the provider throttles it.
+
+    Requests are throttled by wrapping the model in a RateLimitedModel, not
+    here, since one call may send several requests. When the call fails with HTTP 429 it is retried after the larger
+    of the provider's Retry-After and base_delay * 2**attempt, capped at
+    max_delay, plus up to base_delay of jitter. Other errors are raised
+    immediately, as is the 429 once max_retries retries have been used.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except ModelHTTPError as exc:
+            if exc.status_code != TOO_MANY_REQUESTS or attempt == max_retries:
+                raise
+            delay = min(max_delay, max(_retry_after(exc) or 0.0, base_delay * 2**attempt))
+            delay += random.uniform(0, base_delay)
+            logger.warning(
+                "Model '%s' is rate limited; retrying in %.1fs (retry %d of %d)",
+                exc.model_name,
+                delay,
+                attempt + 1,
+                max_retries,
+            )
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
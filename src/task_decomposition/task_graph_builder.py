@@ -1,27 +1,45 @@
+from collections import deque
 from dataclasses import dataclass, field
-from typing import List, Literal, Union
-from graphlib import TopologicalSorter
+from functools import cached_property
+from typing import Any, Callable, Final, Iterator, Literal, Mapping, Optional, Sequence, Union
+from graphlib import CycleError
 
-from task_decomposition.models_schema import TaskPlan
+from pydantic_ai.usage import RunUsage
 
+from task_decomposition.models_schema import Task, TaskPlan
 
-OutputPrimitiveType = Literal["string", "integer", "float"]
-OutputPrimitiveValue = Union[str, int, float]
 
+OutputPrimitiveType = Literal["string", "integer", "float", "boolean"]
+OutputPrimitiveValue = Union[str, int, float, bool]
 
-@dataclass(frozen=True)
+# Checks that a value matches its declared output type. `type(v) is int`
+# rejects bools (a subclass of int) without a second isinstance check, and
+# ints are accepted as valid floats.
+_TYPE_CHECKS: Final[Mapping[str, Callable[[Any], bool]]] = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: type(value) is int,
+    "float": lambda value: type(value) is float or type(value) is int,
+    "boolean": lambda value: type(value) is bool,
+}
+
+
+@dataclass(frozen=True, slots=True)
 class DelegateRunResult:
     """
     Immutable container for the result of a delegate agent run.
 
     Attributes:
         id: A unique identifier for this run result.
-        output_types: A list describing the type of each corresponding value in `outputs`.
-        outputs: The list of output values produced by the delegate agent.
+        output_types: A sequence describing the type of each corresponding value in `outputs`.
+        outputs: The sequence of output values produced by the delegate agent.
+            DelegateRunner produces tuples for both.
+        usage: Token usage of the delegate run, including tokens served from
+            the provider's prompt cache. None if the runner does not report usage.
     """
     id: str
-    output_types: List[OutputPrimitiveType] = field()
-    outputs: List[OutputPrimitiveValue] = field()
+    output_types: Sequence[OutputPrimitiveType] = field()
+    outputs: Sequence[OutputPrimitiveValue] = field()
+    usage: Optional[RunUsage] = field(default=None, compare=False)
 
     def __post_init__(self) -> None:
         # Ensure lengths match
@@ -33,45 +51,185 @@ class DelegateRunResult:
 
         # Validate each output against its declared type
         for index, (declared_type, value) in enumerate(zip(self.output_types, self.outputs)):
-            if declared_type == "string":
-                if not isinstance(value, str):
-                    raise TypeError(
-                        f"Output at index {index} expected type 'string' but got "
-                        f"{type(value).__name__}: {value!r}"
-                    )
-            elif declared_type == "integer":
-                # Reject bools, which are subclasses of int
-                if not (isinstance(value, int) and not isinstance(value, bool)):
-                    raise TypeError(
-                        f"Output at index {index} expected type 'integer' but got "
-                        f"{type(value).__name__}: {value!r}"
-                    )
-            elif declared_type == "float":
-                # Allow ints to be treated as valid floats
-                if not (isinstance(value, (float, int)) and not isinstance(value, bool)):
-                    raise TypeError(
-                        f"Output at index {index} expected type 'float' but got "
-                        f"{type(value).__name__}: {value!r}"
-                    )
-            else:
+            check = _TYPE_CHECKS.get(declared_type)
+            if check is None:
                 # This should be unreachable due to the Literal type, but guard anyway
                 raise ValueError(f"Unsupported output type: {declared_type!r}")
+            if not check(value):
+                raise TypeError(
+                    f"Output at index {index} expected type '{declared_type}' but got "
+                    f"{type(value).__name__}: {value!r}"
+                )
 
 
 class TaskGraphBuilder:
     _taskPlan: TaskPlan
 
     def __init__(self, task_plan: TaskPlan):
+        """
+        Raises:
+            ValueError: If two tasks in the TaskPlan share an id.
+        """
         self._taskPlan = task_plan
 
-    def get_sorted_id_list(self):
-        sorted_id_list: list[str] = []
-        topology = {}
+        # Task ids, collected once so dependency references are checked in O(1)
+        self._id_set: set[str] = set()
+        for task in task_plan.tasks:
+            if task.id in self._id_set:
+                raise ValueError(f"Duplicate task id {task.id!r} in TaskPlan")
+            self._id_set.add(task.id)
+
+        # Execution layers, computed on the first call to get_execution_layers.
+        # The TaskPlan is frozen, so they never go stale.
+        self._layers: Optional[list[list[str]]] = None
+
+        # Unmet dependency counts of the current ready-queue schedule, reset
+        # by get_ready_queue and decremented by mark_done.
+        self._remaining: dict[str, int] = {}
+
+    @cached_property
+    def tasks_by_id(self) -> dict[str, Task]:
+        """
+        Map each task id to its Task. Built once and shared; do not mutate.
+        """
+        return {task.id: task for task in self._taskPlan.tasks}
+
+    @cached_property
+    def in_degree(self) -> dict[str, int]:
+        """
+        Map each task id to the number of dependencies it declares. Built
+        once and shared; do not mutate.
+        """
+        return {task.id: len(task.dependsOn) for task in self._taskPlan.tasks}
+
+    @cached_property
+    def dependents(self) -> dict[str, list[str]]:
+        """
+        Map each task id to the ids of the tasks that depend on it, in
+        TaskPlan order. Tasks nothing depends on are left out. Built once and
+        shared; do not mutate.
+        """
+        dependents: dict[str, list[str]] = {}
+        for task in self._taskPlan.tasks:
+            for dep in task.dependsOn:
+                dependents.setdefault(dep.taskId, []).append(task.id)
+        return dependents
+
+    def get_ready_queue(self) -> deque[str]:
+        """
+        Start a new schedule and return the ids of the tasks without
+        dependencies, which are ready to run.
+
+        As each task completes, pass its id to mark_done to learn which tasks
+        it made ready. Call get_execution_layers first to check the TaskPlan
+        for undefined dependencies and cycles: tasks on a cycle never become
+        ready.
+        """
+        self._remaining = dict(self.in_degree)
+        return deque(task_id for task_id, count in self._remaining.items() if count == 0)
+
+    def mark_done(self, task_id: str) -> list[str]:
+        """
+        Record that task_id has completed and return the ids of its dependents
+        whose dependencies have now all completed.
+        """
+        ready: list[str] = []
+        remaining = self._remaining
+        for dependent_id in self.dependents.get(task_id, ()):
+            remaining[dependent_id] -= 1
+            if remaining[dependent_id] == 0:
+                ready.append(dependent_id)
+        return ready
+
+    def validate_refs(self) -> None:
+        """
+        Check that every dependency refers to a task in the TaskPlan.
+
+        Raises:
+            KeyError: If a task depends on a task id that is not in the TaskPlan.
+        """
         for task in self._taskPlan.tasks:
-            deps: list[str] = []
             for dep in task.dependsOn:
-                deps.append(dep.taskId)
-            topology[task.id] = deps
-        ts: TopologicalSorter = TopologicalSorter(topology)
-        sorted_id_list = list(ts.static_order())
-        return sorted_id_list
+                if dep.taskId not in self._id_set:
+                    raise KeyError(
+                        f"Dependency task with id {dep.taskId!r} not found in TaskPlan "
+                        f"for task {task.id!r}"
+                    )
+
+    def get_sorted_id_list(self) -> Iterator[str]:
+        """
+        Yield task ids in an order where every task follows its dependencies.
+
+        The order is read from the execution layers, which are computed once,
+        so repeated calls do not sort the graph again.
+
+        Raises:
+            KeyError: If a task depends on a task id that is not in the TaskPlan.
+            CycleError: If the dependencies contain a cycle.
+        """
+        layers = self.get_execution_layers()
+        return (task_id for layer in layers for task_id in layer)
+
+    def get_execution_layers(self) -> list[list[str]]:
+        """
+        Group task ids into layers that can each be executed concurrently.
+
+        Uses Kahn's algorithm: the first layer holds every task without
+        dependencies, and each following layer holds the tasks whose
+        dependencies all appear in earlier layers. Within a layer, tasks keep
+        their order from the TaskPlan, so the layers do not depend on the
+        order in which dependencies happen to release their dependents.
+
+        The layers are computed once and the same list is returned on every
+        call, so it must not be mutated.
+
+        Raises:
+            KeyError: If a task depends on a task id that is not in the TaskPlan.
+            CycleError: If the dependencies contain a cycle.
+        """
+        if self._layers is not None:
+            return self._layers
+
+        self.validate_refs()
+
+        # Count unmet dependencies per task, starting from the declared counts
+        in_degree = dict(self.in_degree)
+        dependents = self.dependents
+
+        layers: list[list[str]] = []
+        layer = [task_id for task_id, count in in_degree.items() if count == 0]
+        if len(layer) == len(in_degree):
+            # No task has dependencies, so they all run in one layer
+            self._layers = [layer] if layer else []
+            return self._layers
+
+        # Position of each task in the TaskPlan, for ordering later layers
+        position = {task_id: index for index, task_id in enumerate(in_degree)}
+
+        emitted = 0
+        while layer:
+            layers.append(layer)
+            emitted += len(layer)
+            next_layer: list[str] = []
+            for task_id in layer:
+                # Release dependents whose dependencies are now all in earlier
+                # layers; most tasks have none
+                task_dependents = dependents.get(task_id)
+                if task_dependents is None:
+                    continue
+                for dependent_id in task_dependents:
+                    in_degree[dependent_id] -= 1
+                    if in_degree[dependent_id] == 0:
+                        next_layer.append(dependent_id)
+            # Dependents are released in the order of the tasks they depend on
+            next_layer.sort(key=position.__getitem__)
+            layer = next_layer
+
+        if emitted < len(in_degree):
+            pending = sorted(task_id for task_id, count in in_degree.items() if count > 0)
+            raise CycleError(
+                f"TaskPlan contains a dependency cycle; unable to execute tasks {pending!r}",
+                pending,
+            )
+        self._layers = layers
+        return layers
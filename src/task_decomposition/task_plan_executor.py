@@ -1,6 +1,8 @@
+import asyncio
 import logging
-from typing import Dict
+from typing import Dict, Optional
 
+from pydantic_ai.usage import RunUsage
 from rich.progress import Progress
 
 from task_decomposition.models_schema import TaskPlan, Task
@@ -14,18 +16,38 @@ class TaskPlanExecutor:
     """
     Executes a TaskPlan in dependency order.
 
-    - Uses TaskGraphBuilder to obtain a topologically sorted list of task IDs.
-    - For each task ID, finds the corresponding Task in the TaskPlan.
-    - Prepares a DelegateContext for the task from dependency results (self.results).
-    - Calls a DelegateRunner to execute the task.
+    - Uses TaskGraphBuilder's ready queue to start each task as soon as all of
+      its dependencies have completed.
+    - For each task, prepares a DelegateContext from dependency results (self.results).
+    - Runs ready tasks concurrently via the DelegateRunner's async API.
     - Stores each result as a DelegateRunResult in self.results, keyed by task ID.
+    - Sums the token usage reported by each result into self.usage.
+
+    max_concurrency optionally bounds how many delegate calls run at once, to
+    stay within the provider's rate limits on wide task graphs. None means no
+    bound.
     """
 
-    def __init__(self, task_plan: TaskPlan, delegate_runner: DelegateRunner) -> None:
+    def __init__(
+        self,
+        task_plan: TaskPlan,
+        delegate_runner: DelegateRunner,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        """
+        Raises:
+            ValueError: If max_concurrency is less than 1.
+        """
         self._task_plan = task_plan
         self._builder = TaskGraphBuilder(task_plan)
+        # Shared with the builder, so the plan is indexed by id only once
+        self._tasks_by_id: Dict[str, Task] = self._builder.tasks_by_id
         self._delegate_runner = delegate_runner
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1 or None, got {max_concurrency}")
+        self._max_concurrency = max_concurrency
         self.results: Dict[str, DelegateRunResult] = {}
+        self.usage: RunUsage = RunUsage()
 
     def execute(self) -> None:
         """
@@ -33,41 +55,82 @@ class TaskPlanExecutor:
 
         The results are stored in self.results, keyed by task.id.
         """
-        sorted_ids = self._builder.get_sorted_id_list()
+        asyncio.run(self.execute_async())
 
-        # Build a quick lookup from id -> Task
-        tasks_by_id: Dict[str, Task] = {task.id: task for task in self._task_plan.tasks}
+    async def execute_async(self) -> None:
+        """
+        Execute all tasks in the TaskPlan, running independent tasks concurrently.
+
+        Tasks are scheduled from a ready queue: every task without dependencies
+        starts at once, and each task starts as soon as the last of its
+        dependencies completes, rather than waiting for every task of an
+        earlier layer. Wall-clock time is bounded by the slowest chain of
+        dependent tasks rather than the sum of all tasks.
+
+        The results are stored in self.results, keyed by task.id. If a task
+        fails, the tasks still running are cancelled and have finished before
+        the error is raised.
+
+        Raises:
+            KeyError: If a task depends on a task id that is not in the TaskPlan.
+            graphlib.CycleError: If the dependencies contain a cycle. Raised
+                before any task is executed.
+        """
+        # Raises before any task runs if the plan has a cycle or an undefined dependency
+        self._builder.get_execution_layers()
+
+        semaphore = (
+            asyncio.Semaphore(self._max_concurrency) if self._max_concurrency is not None else None
+        )
+
+        async def run_task(task: Task) -> DelegateRunResult:
+            delegate_context = self._build_delegate_context(task)
+            if semaphore is None:
+                return await self.run_async(task, delegate_context)
+            async with semaphore:
+                return await self.run_async(task, delegate_context)
+
+        ready = self._builder.get_ready_queue()
+        running: Dict[asyncio.Task[DelegateRunResult], Task] = {}
 
         # Use a Rich progress bar to show execution progress across tasks
         with Progress() as progress:
             task_progress = progress.add_task(
-                "[green]Executing tasks...", total=len(sorted_ids)
+                "[green]Executing tasks...", total=len(self._tasks_by_id)
             )
 
-            for task_id in sorted_ids:
-                task = tasks_by_id.get(task_id)
-                if task is None:
-                    raise KeyError(f"Task with id {task_id!r} not found in TaskPlan")
-
-                # Build DelegateContext for this task based on its dependencies
-                delegate_context = self._build_delegate_context(task, tasks_by_id)
-
-                # Execute the task via the delegate runner and store the result
-                result = self.run(task, delegate_context)
-                if not isinstance(result, DelegateRunResult):
-                    raise TypeError(
-                        f"run() must return a DelegateRunResult, got {type(result).__name__}"
-                    )
-                self.results[task_id] = result
-
-                # Advance the progress bar after each task completes
-                progress.advance(task_progress, 1)
-
-    def _build_delegate_context(
-        self,
-        task: Task,
-        tasks_by_id: Dict[str, Task],
-    ) -> DelegateContext:
+            try:
+                while ready or running:
+                    # Start every task whose dependencies have all completed
+                    while ready:
+                        task = self._tasks_by_id[ready.popleft()]
+                        running[asyncio.ensure_future(run_task(task))] = task
+
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                    for future in done:
+                        task = running.pop(future)
+                        result = future.result()
+                        # Contract check for custom runners; stripped under python -O
+                        if __debug__ and not isinstance(result, DelegateRunResult):
+                            raise TypeError(
+                                f"run_async() must return a DelegateRunResult, got {type(result).__name__}"
+                            )
+                        self.results[task.id] = result
+                        if result.usage is not None:
+                            self.usage.incr(result.usage)
+
+                        # Advance the progress bar after each task completes
+                        progress.advance(task_progress, 1)
+                        ready.extend(self._builder.mark_done(task.id))
+            finally:
+                for future in running:
+                    future.cancel()
+                # Wait for the cancelled tasks to finish unwinding, so none is
+                # still running once the error reaches the caller
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def _build_delegate_context(self, task: Task) -> DelegateContext:
         """
         Build a DelegateContext for `task` based on its declared dependencies
         and the previously stored DelegateRunResult objects in self.results.
@@ -77,6 +140,10 @@ class TaskPlanExecutor:
 
         Raises KeyError if a dependency task or its result cannot be found.
         """
+        if not task.dependsOn:
+            # Common for root tasks; share one empty context between them
+            return DelegateContext.EMPTY
+
         dependency_tasks: Dict[str, Task] = {}
         dependency_results: Dict[str, DelegateRunResult] = {}
 
@@ -84,7 +151,7 @@ class TaskPlanExecutor:
             dep_id = dep.taskId
 
             # Look up the dependency Task definition
-            dep_task = tasks_by_id.get(dep_id)
+            dep_task = self._tasks_by_id.get(dep_id)
             if dep_task is None:
                 raise KeyError(
                     f"Dependency task with id {dep_id!r} not found in TaskPlan when "
@@ -118,3 +185,17 @@ class TaskPlanExecutor:
             len(delegate_context.dependency_results),
         )
         return self._delegate_runner.run(task, delegate_context)
+
+    async def run_async(self, task: Task, delegate_context: DelegateContext) -> DelegateRunResult:
+        """
+        Asynchronously execute a single Task and return a DelegateRunResult.
+
+        Delegates the actual execution to the injected DelegateRunner instance.
+        """
+        logger.info(
+            "TaskPlanExecutor.run_async: executing task '%s' with %d dependency tasks and %d dependency results",
+            task.id,
+            len(delegate_context.dependency_tasks),
+            len(delegate_context.dependency_results),
+        )
+        return await self._delegate_runner.run_async(task, delegate_context)
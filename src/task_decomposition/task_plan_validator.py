@@ -1,12 +1,18 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, List, Set
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 from .models_schema import Dependency, Task, TaskPlan
 
 logger = logging.getLogger(__name__)
 
+_INCOMPATIBLE_DEPENDENCY = (
+    "input/output incompatibility detected between dependent tasks; each "
+    "dependency must declare one input per output of the task it depends "
+    "on, with matching types in the same order"
+)
+
 
 class TaskPlanValidator:
     """
@@ -19,8 +25,14 @@ class TaskPlanValidator:
     - Dependencies reference existing tasks.
     - Dependency inputs are compatible with the outputs of the referenced tasks.
     - The dependency graph is acyclic.
+
+    After a failed validation, `last_error` describes why the TaskPlan was
+    rejected, so the reason can be fed back to the planner.
     """
 
+    def __init__(self) -> None:
+        self.last_error: Optional[str] = None
+
     def validate(self, task_plan: TaskPlan) -> bool:
         """
         Validate the given TaskPlan.
@@ -31,43 +43,77 @@ class TaskPlanValidator:
         Returns:
             bool: True if the TaskPlan is considered valid, False otherwise.
         """
+        self.last_error = None
+
         # Empty plan is trivially valid
         if not task_plan.tasks:
             return True
 
         # Build a mapping from task id to Task, and ensure uniqueness
+        task_by_id: Dict[str, Task] = {task.id: task for task in task_plan.tasks}
+        if len(task_by_id) != len(task_plan.tasks):
+            # Duplicate task IDs are invalid
+            self._fail(f"duplicate task id '{self._first_duplicate_id(task_plan.tasks)}' detected")
+            return False
+
+        # 1 and 2. Check that all dependencies reference existing tasks and that
+        # their inputs are compatible
+        error = self._validate_dependencies(task_plan.tasks, task_by_id)
+        if error is not None:
+            self._fail(error)
+            return False
+
+        # 3. Check that the dependency graph is acyclic
+        cycles = self._find_cycles(task_by_id)
+        if cycles:
+            self._fail(self._cycles_reason(cycles))
+            return False
+
+        return True
+
+    def validate_partial(self, tasks: Sequence[Task]) -> bool:
+        """
+        Check the tasks of a TaskPlan that is still being generated.
+
+        Only errors that no later task can fix are reported: duplicate task
+        IDs, input/output incompatibility between a task and a dependency
+        that has already been received, and dependency cycles among the
+        received tasks. The last task may still be incomplete, so it is not
+        checked.
+
+        Args:
+            tasks: The tasks received so far, in order.
+
+        Returns:
+            bool: False if the TaskPlan can already be rejected, True otherwise.
+        """
+        self.last_error = None
+        complete = tasks[:-1]
+
         task_by_id: Dict[str, Task] = {}
-        for task in task_plan.tasks:
+        for task in complete:
             if task.id in task_by_id:
-                # Duplicate task IDs are invalid
-                logger.warning(
-                    "TaskPlan validation failed: duplicate task id '%s' detected",
-                    task.id,
-                )
+                self._fail(f"duplicate task id '{task.id}' detected")
                 return False
             task_by_id[task.id] = task
 
-        # 1. Check that all dependencies reference existing tasks
-        if not self._dependencies_reference_existing_tasks(task_plan.tasks, task_by_id):
-            logger.warning(
-                "TaskPlan validation failed: one or more dependencies reference "
-                "undefined tasks"
-            )
-            return False
-
-        # 2. Check input/output compatibility for each dependency
-        if not self._validate_input_output_compatibility(task_plan.tasks, task_by_id):
-            logger.warning(
-                "TaskPlan validation failed: input/output incompatibility detected "
-                "between dependent tasks"
-            )
-            return False
+        for task in complete:
+            for dep in task.dependsOn:
+                producer = task_by_id.get(dep.taskId)
+                if producer is not None and producer.output_types != dep.input_types:
+                    self._fail(
+                        f"input/output incompatibility detected between task '{task.id}' "
+                        f"and its dependency '{producer.id}'; each dependency must declare "
+                        "one input per output of the task it depends on, with matching "
+                        "types in the same order"
+                    )
+                    return False
 
-        # 3. Check that the dependency graph is acyclic
-        if self._has_cycles(task_plan.tasks):
-            logger.warning(
-                "TaskPlan validation failed: cyclic dependency detected in task graph"
-            )
+        # A cycle is closed as soon as its last task arrives; references to
+        # tasks that have not been received yet cannot be part of one
+        cycles = self._find_cycles(task_by_id)
+        if cycles:
+            self._fail(self._cycles_reason(cycles))
             return False
 
         return True
@@ -76,109 +122,171 @@ class TaskPlanValidator:
     # Helper methods
     # -------------------------------------------------------------------------
 
-    def _dependencies_reference_existing_tasks(
-        self, tasks: List[Task], task_by_id: Dict[str, Task]
-    ) -> bool:
+    def _fail(self, reason: str) -> None:
+        """
+        Record and log the reason a TaskPlan failed validation.
         """
-        Ensure every Dependency.taskId refers to an existing Task.id.
+        self.last_error = reason
+        logger.warning("TaskPlan validation failed: %s", reason)
+
+    @staticmethod
+    def _first_duplicate_id(tasks: Sequence[Task]) -> Optional[str]:
         """
+        Return the first task id that appears more than once, if any.
+        """
+        seen: Set[str] = set()
         for task in tasks:
-            for dep in task.dependsOn:
-                if dep.taskId not in task_by_id:
-                    logger.debug(
-                        "Dependency reference error: task '%s' depends on undefined "
-                        "task '%s'",
-                        task.id,
-                        dep.taskId,
-                    )
-                    return False
-        return True
+            if task.id in seen:
+                return task.id
+            seen.add(task.id)
+        return None
 
-    def _validate_input_output_compatibility(
-        self, tasks: List[Task], task_by_id: Dict[str, Task]
-    ) -> bool:
+    def _validate_dependencies(
+        self, tasks: Sequence[Task], task_by_id: Dict[str, Task]
+    ) -> Optional[str]:
         """
-        For each dependency, ensure:
+        Check every dependency in a single pass over the tasks, ensuring:
 
+        - Dependency.taskId refers to an existing Task.id.
         - The number of inputs equals the number of outputs of the referenced task.
         - Each input.type matches the corresponding output.type.
+
+        Returns:
+            The reason the first failing dependency is invalid, or None if all
+            are valid.
         """
         for task in tasks:
             for dep in task.dependsOn:
-                producer: Task = task_by_id[dep.taskId]
-                producer_outputs = producer.outputs
-                dep_inputs = dep.inputs
+                producer = task_by_id.get(dep.taskId)
+                if producer is None:
+                    logger.debug(
+                        "Dependency reference error: task '%s' depends on undefined "
+                        "task '%s'",
+                        task.id,
+                        dep.taskId,
+                    )
+                    return "one or more dependencies reference undefined tasks"
+
+                # One tuple comparison covers both the count and every type
+                if producer.output_types == dep.input_types:
+                    continue
 
-                # Count must match
-                if len(producer_outputs) != len(dep_inputs):
+                producer_types = producer.output_types
+                input_types = dep.input_types
+                if len(producer_types) != len(input_types):
                     logger.debug(
                         "Input/output count mismatch: task '%s' depends on '%s' "
                         "with %d inputs but producer has %d outputs",
                         task.id,
                         producer.id,
-                        len(dep_inputs),
-                        len(producer_outputs),
+                        len(input_types),
+                        len(producer_types),
                     )
-                    return False
+                else:
+                    # Types must match positionally
+                    for index, (out_type, in_type) in enumerate(zip(producer_types, input_types)):
+                        if out_type != in_type:
+                            logger.debug(
+                                "Input/output type mismatch at position %d: "
+                                "task '%s' depends on '%s' (output type '%s') "
+                                "but input type is '%s'",
+                                index,
+                                task.id,
+                                producer.id,
+                                out_type,
+                                in_type,
+                            )
+                            break
+                return _INCOMPATIBLE_DEPENDENCY
 
-                # Types must match positionally
-                for index, (out, inp) in enumerate(zip(producer_outputs, dep_inputs)):
-                    if out.type != inp.type:
-                        logger.debug(
-                            "Input/output type mismatch at position %d: "
-                            "task '%s' depends on '%s' (output type '%s') "
-                            "but input type is '%s'",
-                            index,
-                            task.id,
-                            producer.id,
-                            out.type,
-                            inp.type,
-                        )
-                        return False
+        return None
 
-        return True
+    @staticmethod
+    def _cycles_reason(cycles: List[List[str]]) -> str:
+        """
+        Describe the cycles found by _find_cycles as a validation failure.
+        """
+        return "cyclic dependency detected in task graph; cycles: " + "; ".join(
+            ", ".join(cycle) for cycle in cycles
+        )
 
-    def _has_cycles(self, tasks: List[Task]) -> bool:
+    @staticmethod
+    def _find_cycles(task_by_id: Dict[str, Task]) -> List[List[str]]:
         """
-        Detect cycles in the dependency graph using DFS.
+        Return the ids of the tasks in every dependency cycle, one list per
+        strongly connected component that contains a cycle.
 
-        We treat an edge as: task -> dependency_task (i.e., a task depends on
-        another task). A cycle exists if we can reach a node that is already
-        on the current DFS recursion stack.
+        A single pass of Tarjan's algorithm both detects the cycles and names
+        every task on them, so a rejection describes all cycles at once rather
+        than just the first. The search walks each task's dependsOn through
+        the task_by_id map the caller has already built, rather than building
+        a separate adjacency list. Dependencies on ids that are not in the map
+        are ignored.
         """
-        # Build adjacency list: task_id -> list of task_ids it depends on
-        adjacency: Dict[str, List[str]] = {
-            task.id: [dep.taskId for dep in task.dependsOn] for task in tasks
-        }
-
-        visited: Set[str] = set()
-        in_stack: Set[str] = set()
-
-        def dfs(node: str, path: List[str]) -> bool:
-            if node in in_stack:
-                # Found a back edge -> cycle
-                cycle_path = path + [node]
-                logger.debug(
-                    "Cycle detected in task dependencies: %s",
-                    " -> ".join(cycle_path),
-                )
-                return True
-            if node in visited:
-                return False
+        cycles: List[List[str]] = []
+        for component in _find_sccs_iterative(task_by_id):
+            # A single task is only a cycle if it depends on itself
+            if len(component) > 1 or any(
+                dep.taskId == component[0] for dep in task_by_id[component[0]].dependsOn
+            ):
+                cycles.append(sorted(component))
+                logger.debug("Dependency cycle between tasks: %s", ", ".join(cycles[-1]))
+        return cycles
 
-            visited.add(node)
-            in_stack.add(node)
 
-            for neighbor in adjacency.get(node, []):
-                if dfs(neighbor, path + [neighbor]):
-                    return True
+def _find_sccs_iterative(task_by_id: Dict[str, Task]) -> List[List[str]]:
+    """
+    Find the strongly connected components of the dependency graph with
+    Tarjan's algorithm, following each task's dependsOn.
 
-            in_stack.remove(node)
-            return False
+    The DFS keeps an explicit stack of (task id, iterator over its
+    dependencies) pairs instead of recursing, so it runs in O(V + E) with no
+    recursion limit.
+    """
+    index_of: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    components: List[List[str]] = []
 
-        for task in tasks:
-            if task.id not in visited:
-                if dfs(task.id, [task.id]):
-                    return True
+    for root, root_task in task_by_id.items():
+        if root in index_of:
+            continue
+        index_of[root] = lowlink[root] = len(index_of)
+        stack.append(root)
+        on_stack.add(root)
+        work: List[Tuple[str, Iterator[Dependency]]] = [(root, iter(root_task.dependsOn))]
+
+        while work:
+            node, dependencies = work[-1]
+            for dep in dependencies:
+                neighbor = dep.taskId
+                if neighbor not in index_of:
+                    neighbor_task = task_by_id.get(neighbor)
+                    if neighbor_task is None:
+                        continue
+                    # Descend into the neighbour; node resumes from here later
+                    index_of[neighbor] = lowlink[neighbor] = len(index_of)
+                    stack.append(neighbor)
+                    on_stack.add(neighbor)
+                    work.append((neighbor, iter(neighbor_task.dependsOn)))
+                    break
+                if neighbor in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[neighbor])
+            else:
+                # Every dependency of node has been explored
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_of[node]:
+                    component: List[str] = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
 
-        return False
+    return components
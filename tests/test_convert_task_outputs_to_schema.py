@@ -1,8 +1,9 @@
 import json
 
 import pytest
+from pydantic import ValidationError
 
-from task_decomposition.models_schema import Task, Output
+from task_decomposition.models_schema import Dependency, Input, Task, Output
 
 
 class TestOutputsToSchema:
@@ -132,7 +133,7 @@ class TestOutputsToSchema:
 
         # Keys must be item_0..item_{n-1} in order
         expected_keys = [f"item_{i}" for i in range(len(outputs))]
-        assert sorted(properties.keys()) == sorted(expected_keys)
+        assert properties.keys() == set(expected_keys)
 
         json_type_map = {
             "string": "string",
@@ -151,4 +152,54 @@ class TestOutputsToSchema:
 
         required = schema.get("required", [])
         # All properties should be required and match the item_i keys
-        assert sorted(required) == sorted(expected_keys)
+        assert set(required) == set(expected_keys)
+
+    def test_outputs_to_schema_is_shared_between_identical_outputs(self):
+        """
+        Tasks with the same outputs reuse one memoized schema string, and the
+        outputs of a Task cannot be reassigned afterwards.
+        """
+        outputs = [Output(description="A summary", type="string")]
+        first = Task(id="first", prompt="Role: X\n", outputs=outputs)
+        second = Task(id="second", prompt="Role: Y\n", outputs=outputs)
+
+        assert first.OutputsToSchema() is second.OutputsToSchema()
+        with pytest.raises(ValidationError):
+            first.outputs = []
+
+
+def test_task_ids_are_interned():
+    task_id = "".join(["task", "_1"])
+    task = Task(id=task_id, prompt="p")
+    dependency = Dependency(taskId="".join(["task", "_1"]))
+
+    assert task.id is dependency.taskId
+
+
+def test_output_and_input_types_are_cached_tuples():
+    task = Task(
+        id="t1",
+        prompt="p",
+        outputs=[Output(description="a", type="string"), Output(description="b", type="integer")],
+    )
+    dependency = Dependency(
+        taskId="t1",
+        inputs=[Input(description="a", type="string"), Input(description="b", type="integer")],
+    )
+
+    assert task.output_types == ("string", "integer")
+    assert task.output_types is task.output_types
+    assert dependency.input_types == task.output_types
+
+
+def test_collections_are_stored_as_tuples():
+    """
+    List fields are stored as tuples, so frozen models are hashable.
+    """
+    output = Output(description="a", type="string")
+    first = Task(id="t1", prompt="p", outputs=[output])
+    second = Task(id="t1", prompt="p", outputs=(output,))
+
+    assert first.outputs == (output,)
+    assert first == second
+    assert hash(first) == hash(second)
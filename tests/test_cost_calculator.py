@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from task_decomposition.cost_calculator import (
+    BudgetExceededError,
+    calculate_cost,
+    check_input_budget,
+    estimate_tokens,
+)
+
+
+def test_calculate_cost_input_and_output_tokens():
+    # 1M input tokens at $1.25/M plus 100k output tokens at $10/M
+    usage = SimpleNamespace(input_tokens=1_000_000, output_tokens=100_000)
+
+    assert calculate_cost(usage) == "Cost: $2.2500000"
+
+
+def test_calculate_cost_zero_usage():
+    usage = SimpleNamespace(input_tokens=0, output_tokens=0)
+
+    assert calculate_cost(usage) == "Cost: $0.0000000"
+
+
+def test_calculate_cost_bills_cached_tokens_at_cached_rate_only():
+    # 1M input tokens, of which 800k were cache hits:
+    # 200k * $1.25/M + 800k * $0.125/M = $0.25 + $0.10
+    usage = SimpleNamespace(
+        input_tokens=1_000_000,
+        output_tokens=0,
+        cache_read_tokens=800_000,
+    )
+
+    assert calculate_cost(usage) == "Cost: $0.3500000"
+
+
+def test_calculate_cost_uses_model_prices():
+    usage = SimpleNamespace(input_tokens=1_000_000, output_tokens=1_000_000)
+
+    # gpt-5-mini: $0.25/M input, $2.00/M output; provider prefix is ignored
+    assert calculate_cost(usage, model="openai:gpt-5-mini") == "Cost: $2.2500000"
+
+
+def test_calculate_cost_unknown_model():
+    usage = SimpleNamespace(input_tokens=1, output_tokens=1)
+
+    with pytest.raises(ValueError):
+        calculate_cost(usage, model="unknown-model")
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_check_input_budget():
+    # 4M characters ~ 1M tokens at $1.25/M
+    prompt = "x" * 4_000_000
+
+    assert check_input_budget("gpt-5.1", 1.25, prompt) == 1_250_000_000
+    with pytest.raises(BudgetExceededError):
+        check_input_budget("gpt-5.1", 1.24, prompt)
@@ -0,0 +1,285 @@
+import pytest
+from pydantic_ai import Agent, format_as_xml
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from task_decomposition import delegate_runner
+from task_decomposition.delegate_runner import DelegateContext, DelegateRunner
+from task_decomposition.models_schema import Task, Dependency, Input, Output
+from task_decomposition.task_graph_builder import DelegateRunResult
+
+
+PROMPT = "Role: X\nIntent: Y\nContext: Z\nConstraints: C\nOutput: O\n"
+
+
+def make_producer(id_: str) -> Task:
+    return Task(
+        id=id_,
+        prompt=PROMPT,
+        outputs=[Output(description=f"Output of {id_}", type="string")],
+    )
+
+
+def make_result(id_: str) -> DelegateRunResult:
+    return DelegateRunResult(id=id_, output_types=["string"], outputs=[f"value of {id_}"])
+
+
+def test_build_prompt_dict_is_independent_of_dependency_order():
+    """
+    The prompt must be byte-identical regardless of the order in which
+    dependencies were declared or collected, so provider prompt caching hits.
+    """
+    producers = {id_: make_producer(id_) for id_ in ("b", "a")}
+    consumer = Task(
+        id="consumer",
+        prompt=PROMPT,
+        dependsOn=[
+            Dependency(taskId="b", inputs=[Input(description="from b", type="string")]),
+            Dependency(taskId="a", inputs=[Input(description="from a", type="string")]),
+        ],
+    )
+
+    forward = DelegateContext(
+        dependency_tasks={"a": producers["a"], "b": producers["b"]},
+        dependency_results={"a": make_result("a"), "b": make_result("b")},
+    )
+    backward = DelegateContext(
+        dependency_tasks={"b": producers["b"], "a": producers["a"]},
+        dependency_results={"b": make_result("b"), "a": make_result("a")},
+    )
+
+    runner = DelegateRunner()
+    forward_dict = runner.build_prompt_dict(forward, consumer)
+    backward_dict = runner.build_prompt_dict(backward, consumer)
+
+    assert forward_dict == backward_dict
+    assert [dep["task_id"] for dep in forward_dict["dependencies"]] == ["a", "b"]
+    # The task's own prompt goes last so the system prompt stays static
+    assert list(forward_dict)[-1] == "current_task_prompt"
+    assert forward_dict["current_task_prompt"] == PROMPT
+
+
+def test_build_prompt_xml_matches_format_as_xml():
+    """
+    The direct XML writer must produce the same XML as pydantic-ai's generic
+    format_as_xml applied to every shape build_prompt_dict can return.
+    """
+    producer = make_producer("producer")
+    consumer = Task(
+        id="consumer",
+        prompt="Use <values> & \"quotes\"\nacross lines",
+        dependsOn=[
+            Dependency(taskId="producer", inputs=[Input(description="a < b", type="string")]),
+            Dependency(taskId="silent", inputs=[]),
+        ],
+    )
+    context = DelegateContext(
+        dependency_tasks={"producer": producer, "silent": make_producer("silent")},
+        dependency_results={"producer": make_result("producer")},
+    )
+    no_deps_context = DelegateContext(dependency_tasks={}, dependency_results={})
+    runner = DelegateRunner()
+
+    assert runner.build_prompt_xml(context, consumer) == format_as_xml(
+        runner.build_prompt_dict(context, consumer)
+    )
+    assert runner.build_prompt_xml(no_deps_context, producer) == format_as_xml(
+        runner.build_prompt_dict(no_deps_context, producer)
+    )
+
+
+def test_build_prompt_rejects_result_with_wrong_number_of_outputs():
+    producer = Task(
+        id="producer",
+        prompt=PROMPT,
+        outputs=[
+            Output(description="A title", type="string"),
+            Output(description="A summary", type="string"),
+        ],
+    )
+    consumer = Task(id="consumer", prompt=PROMPT, dependsOn=[Dependency(taskId="producer")])
+    context = DelegateContext(
+        dependency_tasks={"producer": producer},
+        dependency_results={"producer": make_result("producer")},
+    )
+    runner = DelegateRunner()
+
+    with pytest.raises(ValueError, match="'producer' has 1 outputs but the task declares 2"):
+        runner.build_prompt_xml(context, consumer)
+    with pytest.raises(ValueError, match="'producer' has 1 outputs but the task declares 2"):
+        runner.build_prompt_dict(context, consumer)
+
+
+@pytest.fixture
+def run_output_dir(tmp_path, monkeypatch):
+    # pydantic-ai's TestModel calls every tool, so keep save_file inside tmp_path
+    monkeypatch.setattr(delegate_runner, "RUN_OUTPUT_DIR", tmp_path)
+    return tmp_path
+
+
+def test_save_file_writes_under_run_output_dir(run_output_dir):
+    first = delegate_runner.save_file("docs/a.md", "# A\n")
+    second = delegate_runner.save_file("docs/b.md", "# B\n")
+
+    assert first == str(run_output_dir / "docs" / "a.md")
+    assert (run_output_dir / "docs" / "a.md").read_text(encoding="utf-8") == "# A\n"
+    assert (run_output_dir / "docs" / "b.md").read_text(encoding="utf-8") == "# B\n"
+    assert second == str(run_output_dir / "docs" / "b.md")
+
+
+def test_run_reuses_cached_response_for_identical_call(run_output_dir, tmp_path):
+    # The "test" model is pydantic-ai's TestModel, which never calls an LLM
+    runner = DelegateRunner(model="test", cache_dir=tmp_path / "cache")
+    task = Task(
+        id="task",
+        prompt=PROMPT,
+        outputs=[
+            Output(description="A title", type="string"),
+            Output(description="A count", type="integer"),
+        ],
+    )
+    context = DelegateContext(dependency_tasks={}, dependency_results={})
+
+    first = runner.run(task, context)
+    second = runner.run(task, context)
+
+    assert first.id == "task"
+    assert first.output_types == ("string", "integer")
+    assert first.usage.requests > 0
+    assert second == first
+    # A cache hit costs nothing
+    assert second.usage.requests == 0
+
+
+def test_run_streamed_returns_same_outputs_as_non_streamed(run_output_dir):
+    task = Task(
+        id="task",
+        prompt=PROMPT,
+        outputs=[
+            Output(description="A title", type="string"),
+            Output(description="A count", type="integer"),
+        ],
+    )
+    context = DelegateContext(dependency_tasks={}, dependency_results={})
+
+    streamed = DelegateRunner(model="test", stream=True).run(task, context)
+    direct = DelegateRunner(model="test").run(task, context)
+
+    assert streamed == direct
+    assert streamed.usage.requests > 0
+
+
+def test_run_maps_outputs_by_key_not_emission_order(run_output_dir, monkeypatch):
+    def reversed_keys(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        # Emit the output keys in the reverse of the schema order
+        return ModelResponse(
+            parts=[
+                ToolCallPart(
+                    info.output_tools[0].name,
+                    {"item_1": 3, "item_0": "title"},
+                )
+            ]
+        )
+
+    monkeypatch.setattr(
+        delegate_runner,
+        "_build_agent",
+        lambda model, system_prompt: Agent(FunctionModel(reversed_keys)),
+    )
+    task = Task(
+        id="task",
+        prompt=PROMPT,
+        outputs=[
+            Output(description="A title", type="string"),
+            Output(description="A count", type="integer"),
+        ],
+    )
+
+    result = DelegateRunner().run(task, DelegateContext(dependency_tasks={}, dependency_results={}))
+
+    assert result.outputs == ("title", 3)
+
+
+def test_run_retries_outputs_of_the_wrong_type(run_output_dir, monkeypatch):
+    attempts = []
+
+    def wrong_type_first(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        attempts.append(None)
+        count = "three" if len(attempts) == 1 else 3
+        return ModelResponse(
+            parts=[ToolCallPart(info.output_tools[0].name, {"item_0": "title", "item_1": count})]
+        )
+
+    monkeypatch.setattr(
+        delegate_runner,
+        "_build_agent",
+        lambda model, system_prompt: Agent(FunctionModel(wrong_type_first)),
+    )
+    task = Task(
+        id="task",
+        prompt=PROMPT,
+        outputs=[
+            Output(description="A title", type="string"),
+            Output(description="A count", type="integer"),
+        ],
+    )
+
+    result = DelegateRunner().run(task, DelegateContext(dependency_tasks={}, dependency_results={}))
+
+    assert result.outputs == ("title", 3)
+    assert len(attempts) == 2
+
+
+def test_run_replays_disk_cached_response_in_new_run(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    task = Task(
+        id="task",
+        prompt=PROMPT,
+        outputs=[Output(description="A title", type="string")],
+    )
+    context = DelegateContext(dependency_tasks={}, dependency_results={})
+
+    monkeypatch.setattr(delegate_runner, "RUN_OUTPUT_DIR", tmp_path / "run1")
+    first = DelegateRunner(model="test", cache_dir=cache_dir).run(task, context)
+    written = sorted(
+        path.relative_to(tmp_path / "run1")
+        for path in (tmp_path / "run1").rglob("*")
+        if path.is_file()
+    )
+
+    # A fresh runner in a later run is answered from disk, and the files the
+    # delegate saved are written into the new run directory
+    monkeypatch.setattr(delegate_runner, "RUN_OUTPUT_DIR", tmp_path / "run2")
+    second = DelegateRunner(model="test", cache_dir=cache_dir).run(task, context)
+
+    assert second == first
+    assert second.usage.requests == 0
+    assert written
+    for relative_path in written:
+        original = (tmp_path / "run1" / relative_path).read_bytes()
+        assert (tmp_path / "run2" / relative_path).read_bytes() == original
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [b'{"id": "task", "outputs": [', b'{"id": "task", "outputs": ["x"]}', b"[1, 2]"],
+    ids=["truncated", "missing_keys", "wrong_shape"],
+)
+def test_run_calls_delegate_again_for_unreadable_disk_cache_entry(run_output_dir, tmp_path, entry):
+    cache_dir = tmp_path / "cache"
+    task = Task(
+        id="task",
+        prompt=PROMPT,
+        outputs=[Output(description="A title", type="string")],
+    )
+    context = DelegateContext(dependency_tasks={}, dependency_results={})
+    runner = DelegateRunner(model="test", cache_dir=cache_dir)
+    runner.run(task, context)
+    (entry_path,) = cache_dir.glob("*.json")
+    entry_path.write_bytes(entry)
+
+    result = runner.run(task, context)
+
+    assert result.usage.requests > 0
+    # The corrupt entry was replaced by the fresh response
+    assert runner.run(task, context).usage.requests == 0
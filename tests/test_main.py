@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelMessage
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+from task_decomposition import main
+from task_decomposition.cost_calculator import BudgetExceededError
+from task_decomposition.main import _generate_plan, _stream_plan
+from task_decomposition.models_schema import TaskPlan
+from task_decomposition.task_plan_validator import TaskPlanValidator
+
+
+PROMPT = "Role: X\nIntent: Y\nContext: Z\nConstraints: C\nOutput: O\n"
+
+
+def test_stream_plan_reports_usage_of_rejected_stream():
+    def task(task_id: str) -> str:
+        return json.dumps({"id": task_id, "prompt": PROMPT})
+
+    async def duplicate_ids(messages: list[ModelMessage], info: AgentInfo):
+        # Stream a plan one task at a time; the second task repeats the id of
+        # the first, which is rejected once the third task starts arriving
+        chunks = [
+            '{"objective": "objective", "tasks": [',
+            task("t1"),
+            ", ",
+            task("t1"),
+            ", ",
+            task("t2"),
+            "]}",
+        ]
+        yield {0: DeltaToolCall(name=info.output_tools[0].name)}
+        for chunk in chunks:
+            yield {0: DeltaToolCall(json_args=chunk)}
+
+    agent = Agent(FunctionModel(stream_function=duplicate_ids), output_type=TaskPlan)
+
+    plan, rejection, usage, messages = asyncio.run(
+        _stream_plan(agent, TaskPlanValidator(), "plan it", None)
+    )
+
+    assert plan is None
+    assert "duplicate task id 't1'" in rejection
+    assert messages == []
+    # The tokens spent before the stream was abandoned are still counted
+    assert usage.requests == 1
+    assert usage.input_tokens > 0
+    assert usage.output_tokens > 0
+
+
+def test_generate_plan_budget_covers_the_system_prompt(monkeypatch):
+    # About 800 tokens; the user prompt alone fits, the system prompt does not
+    monkeypatch.setattr(main, "PLANNER_MAX_INPUT_COST_USD", 0.001)
+
+    async def unreachable(messages: list[ModelMessage], info: AgentInfo):
+        raise AssertionError("the planner must not be called")
+        yield
+
+    agent = Agent(FunctionModel(stream_function=unreachable), output_type=TaskPlan)
+
+    with pytest.raises(BudgetExceededError):
+        asyncio.run(
+            _generate_plan(
+                agent,
+                TaskPlanValidator(),
+                "openai:gpt-5.1",
+                user_prompt="plan it",
+                system_prompt="x" * 4000,
+            )
+        )
+
+
+def test_parse_args_rejects_models_without_a_known_price(capsys):
+    assert main._parse_args(["--model", "openai:gpt-5-mini"]).model == "openai:gpt-5-mini"
+
+    with pytest.raises(SystemExit):
+        main._parse_args(["--model", "anthropic:claude-sonnet-4-5"])
+    assert "No pricing known for model 'anthropic:claude-sonnet-4-5'" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "option", ["--max-concurrency", "--requests-per-minute", "--tokens-per-minute"]
+)
+@pytest.mark.parametrize("value", ["0", "-1", "many"])
+def test_parse_args_rejects_limits_below_one(option, value):
+    assert getattr(main._parse_args([option, "3"]), option[2:].replace("-", "_")) == 3
+
+    with pytest.raises(SystemExit):
+        main._parse_args([option, value])
@@ -0,0 +1,124 @@
+import pytest
+
+from task_decomposition.models_schema import TaskPlan, Task, Output
+from task_decomposition.plan_cache import PlanCache
+
+
+USER_PROMPT = (
+    "Generate source material for the Sandpoint Hinterlands. Must produce one "
+    "markdown document for each location: The Pyre, The Old Light, Tickwood."
+)
+
+
+def make_plan() -> TaskPlan:
+    return TaskPlan(
+        objective="objective",
+        tasks=[
+            Task(
+                id="t1",
+                prompt="Role: X\nIntent: Y\nContext: Z\nConstraints: C\nOutput: O\n",
+                outputs=[Output(description="desc", type="string")],
+            )
+        ],
+    )
+
+
+def test_get_returns_none_on_miss(tmp_path):
+    cache = PlanCache(tmp_path)
+
+    assert cache.get("model", "system", USER_PROMPT) is None
+
+
+def test_put_then_get_round_trips_plan(tmp_path):
+    cache = PlanCache(tmp_path / "plans")
+    plan = make_plan()
+
+    key = cache.put("model", "system", USER_PROMPT, plan)
+
+    cached = cache.get("model", "system", USER_PROMPT)
+    assert cached.key == key
+    assert cached.plan == plan
+    assert cached.similarity == 1.0
+    # A fresh cache over the same directory sees the stored plan
+    assert PlanCache(tmp_path / "plans").get("model", "system", USER_PROMPT).plan == plan
+
+
+def test_key_depends_on_every_planner_input():
+    base = PlanCache.key("model", "system", "user")
+
+    assert PlanCache.key("model", "system", "user") == base
+    assert PlanCache.key("other", "system", "user") != base
+    assert PlanCache.key("model", "other", "user") != base
+    assert PlanCache.key("model", "system", "other") != base
+
+
+def test_similar_prompt_reuses_plan_only_with_threshold(tmp_path):
+    plan = make_plan()
+    PlanCache(tmp_path).put("model", "system", USER_PROMPT, plan)
+    reworded = USER_PROMPT.replace("Must produce", "You must produce")
+
+    assert PlanCache(tmp_path).get("model", "system", reworded) is None
+
+    cached = PlanCache(tmp_path, similarity_threshold=0.9).get("model", "system", reworded)
+    assert cached.plan == plan
+    assert 0.9 <= cached.similarity < 1.0
+
+
+def test_similar_prompt_is_not_reused_across_models_or_for_different_objectives(tmp_path):
+    PlanCache(tmp_path).put("model", "system", USER_PROMPT, make_plan())
+    cache = PlanCache(tmp_path, similarity_threshold=0.9)
+
+    assert cache.get("other-model", "system", USER_PROMPT) is None
+    assert cache.get("model", "system", "Write a haiku about the sea.") is None
+
+
+def test_evict_removes_plan_and_similarity_entry(tmp_path):
+    cache = PlanCache(tmp_path, similarity_threshold=0.9)
+    key = cache.put("model", "system", USER_PROMPT, make_plan())
+
+    cache.evict(key)
+
+    assert cache.get("model", "system", USER_PROMPT) is None
+    assert cache.get("model", "system", USER_PROMPT.replace("Must", "You must")) is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b'{"objective": "objective", "tasks": [', b'{"objective": 1, "tasks": "nope"}'],
+    ids=["truncated", "old_schema"],
+)
+def test_unreadable_plan_is_evicted_and_treated_as_miss(tmp_path, data):
+    cache = PlanCache(tmp_path, similarity_threshold=0.9)
+    key = cache.put("model", "system", USER_PROMPT, make_plan())
+    (tmp_path / f"{key}.json").write_bytes(data)
+
+    assert cache.get("model", "system", USER_PROMPT) is None
+    assert not (tmp_path / f"{key}.json").exists()
+    assert key not in (tmp_path / "index.json").read_text()
+
+    # The key can be cached again afterwards
+    cache.put("model", "system", USER_PROMPT, make_plan())
+    assert cache.get("model", "system", USER_PROMPT).plan == make_plan()
+
+
+@pytest.mark.parametrize("data", [b"{not json", b'{"key": "not an entry"}'], ids=["corrupt", "malformed"])
+def test_unreadable_index_is_rebuilt(tmp_path, data):
+    cache = PlanCache(tmp_path, similarity_threshold=0.9)
+    cache.put("model", "system", USER_PROMPT, make_plan())
+    (tmp_path / "index.json").write_bytes(data)
+
+    # Exact matches do not need the index; similar prompts lose the old entry
+    assert cache.get("model", "system", USER_PROMPT).plan == make_plan()
+    assert cache.get("model", "system", USER_PROMPT.replace("Must", "You must")) is None
+
+    cache.put("model", "system", USER_PROMPT, make_plan())
+    assert cache.get("model", "system", USER_PROMPT.replace("Must", "You must")) is not None
+
+
+def test_plan_rejected_by_is_valid_is_evicted(tmp_path):
+    cache = PlanCache(tmp_path)
+    key = cache.put("model", "system", USER_PROMPT, make_plan())
+
+    assert cache.get("model", "system", USER_PROMPT, is_valid=lambda plan: False) is None
+    assert not (tmp_path / f"{key}.json").exists()
+    assert cache.get("model", "system", USER_PROMPT) is None
@@ -0,0 +1,22 @@
+from task_decomposition.prompt_caching import prompt_cache_key, prompt_cache_settings
+
+
+def test_openai_models_share_a_prompt_cache_key_per_system_prompt():
+    first = prompt_cache_settings("openai:gpt-5.1", "system prompt")
+    second = prompt_cache_settings("openai:gpt-5-mini", "system prompt")
+    other = prompt_cache_settings("openai:gpt-5.1", "another system prompt")
+
+    assert first["extra_body"] == {"prompt_cache_key": prompt_cache_key("system prompt")}
+    assert second == first
+    assert other != first
+
+
+def test_anthropic_models_mark_the_prompt_prefix_as_cacheable():
+    settings = prompt_cache_settings("anthropic:claude-sonnet-4-5", "system prompt")
+
+    assert settings["anthropic_cache_instructions"] is True
+    assert settings["anthropic_cache_tool_definitions"] is True
+
+
+def test_other_models_get_no_settings():
+    assert prompt_cache_settings("test", "system prompt") is None
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from task_decomposition.rate_limiter import RateLimitedModel, RateLimiter, call_with_backoff
+
+
+def make_flaky_call(failures: int, status_code: int = 429):
+    calls = []
+
+    async def call():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise ModelHTTPError(status_code=status_code, model_name="test")
+        return "ok"
+
+    return call, calls
+
+
+def test_call_with_backoff_retries_throttled_calls():
+    call, calls = make_flaky_call(failures=2)
+
+    result = asyncio.run(call_with_backoff(call, base_delay=0.001))
+
+    assert result == "ok"
+    assert len(calls) == 3
+
+
+def test_call_with_backoff_raises_after_max_retries():
+    call, calls = make_flaky_call(failures=10)
+
+    with pytest.raises(ModelHTTPError):
+        asyncio.run(call_with_backoff(call, max_retries=2, base_delay=0.001))
+
+    assert len(calls) == 3
+
+
+def test_call_with_backoff_does_not_retry_other_errors():
+    call, calls = make_flaky_call(failures=1, status_code=500)
+
+    with pytest.raises(ModelHTTPError):
+        asyncio.run(call_with_backoff(call, base_delay=0.001))
+
+    assert len(calls) == 1
+
+
+def test_rate_limiter_waits_for_token_capacity():
+    # 6000 tokens per minute refill at 100 tokens per second
+    limiter = RateLimiter(tpm=6000)
+
+    async def acquire_twice() -> float:
+        await limiter.acquire(6000)
+        start = time.monotonic()
+        await limiter.acquire(10)
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire_twice()) >= 0.09
+
+
+@pytest.mark.parametrize("limits", [{"rpm": 0}, {"tpm": -1}])
+def test_rate_limiter_rejects_non_positive_limits(limits):
+    with pytest.raises(ValueError):
+        RateLimiter(**limits)
+
+
+class RecordingRateLimiter(RateLimiter):
+    def __init__(self) -> None:
+        super().__init__(rpm=1000)
+        self.acquired: list[int] = []
+
+    async def acquire(self, tokens: int = 0) -> None:
+        self.acquired.append(tokens)
+        await super().acquire(tokens)
+
+
+def test_rate_limited_model_acquires_for_every_request_of_a_run():
+    def call_tool_then_answer(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if len(messages) == 1:
+            return ModelResponse(parts=[ToolCallPart("lookup", {"key": "k"})])
+        return ModelResponse(parts=[TextPart("done")])
+
+    agent = Agent(FunctionModel(call_tool_then_answer), system_prompt="system " * 100)
+
+    @agent.tool_plain
+    def lookup(key: str) -> str:
+        return "value " * 100
+
+    limiter = RecordingRateLimiter()
+    result = asyncio.run(agent.run("prompt", model=RateLimitedModel(agent.model, limiter)))
+
+    assert result.output == "done"
+    # One acquisition per model request, each covering the whole conversation
+    assert len(limiter.acquired) == result.usage().requests == 2
+    assert limiter.acquired[0] >= 175
+    assert limiter.acquired[1] >= limiter.acquired[0] + 150
@@ -1,25 +1,29 @@
+from functools import lru_cache
+from graphlib import CycleError
+
 import pytest
 
 from task_decomposition.models_schema import TaskPlan, Task, Dependency, Input, Output
 from task_decomposition.task_graph_builder import TaskGraphBuilder, DelegateRunResult
 
 
+# The models are frozen, so identical fixtures can be built once and shared
+@lru_cache(maxsize=None)
 def make_input(description: str = "desc", type_: str = "string") -> Input:
     return Input(description=description, type=type_)
 
 
+@lru_cache(maxsize=None)
 def make_output(description: str = "desc", type_: str = "string") -> Output:
     return Output(description=description, type=type_)
 
 
-def test_get_sorted_id():
+@pytest.fixture(scope="module")
+def linear_plan() -> TaskPlan:
     """
-    For now TaskGraphBuilder.get_sorted_id_list is intentionally not implemented.
-    This test documents the current behavior (raising an Exception) so we have a
-    failing test once we start implementing it in the next step.
+    A simple, valid TaskPlan with three tasks and linear dependencies:
+    T1 -> T2 -> T3. Built once per module, since TaskPlan is frozen.
     """
-    # Build a simple, valid TaskPlan with three tasks and linear dependencies:
-    # T1 -> T2 -> T3
     task1 = Task(
         id="T1",
         prompt="Role: Test\nIntent: Task 1\nContext:\nConstraints:\nOutput:",
@@ -54,32 +58,35 @@ def test_get_sorted_id():
         outputs=[make_output("Output of T3")],
     )
 
-    plan = TaskPlan(
+    return TaskPlan(
         objective="Test objective",
         tasks=[task1, task2, task3],
     )
 
-    builder = TaskGraphBuilder(plan)
 
-    # At this stage of "red, green, refactor" we expect the method to raise,
-    # because it's explicitly not implemented yet.
-    sorted: list[str] = builder.get_sorted_id_list()
+def test_get_sorted_id(linear_plan: TaskPlan):
+    """
+    TaskGraphBuilder.get_sorted_id_list yields task ids in an order where
+    every task follows its dependencies.
+    """
+    builder = TaskGraphBuilder(linear_plan)
+
+    sorted: list[str] = list(builder.get_sorted_id_list())
 
-    # Once implemented, we expect a topologically sorted list that respects
-    # the dependencies T1 -> T2 -> T3.
+    # A topologically sorted list that respects the dependencies T1 -> T2 -> T3
     assert sorted == ["T1", "T2", "T3"]
 
 
 def test_delegate_run_result_valid():
     result = DelegateRunResult(
         id="run-1",
-        output_types=["string", "integer", "float"],
-        outputs=["hello", 42, 3.14],
+        output_types=["string", "integer", "float", "boolean"],
+        outputs=["hello", 42, 3.14, True],
     )
 
     assert result.id == "run-1"
-    assert result.output_types == ["string", "integer", "float"]
-    assert result.outputs == ["hello", 42, 3.14]
+    assert result.output_types == ["string", "integer", "float", "boolean"]
+    assert result.outputs == ["hello", 42, 3.14, True]
 
 
 def test_delegate_run_result_invalid_length_mismatch():
@@ -99,6 +106,7 @@ def test_delegate_run_result_invalid_length_mismatch():
         (["float"], ["not-float"]),   # not a float/int
         (["integer"], [True]),        # bool should be rejected for integer
         (["float"], [False]),         # bool should be rejected for float
+        (["boolean"], [1]),           # int should be rejected for boolean
     ],
 )
 def test_delegate_run_result_invalid_type_mismatch(output_types, outputs):
@@ -108,3 +116,125 @@ def test_delegate_run_result_invalid_type_mismatch(output_types, outputs):
             output_types=output_types,
             outputs=outputs,
         )
+
+
+def test_get_execution_layers_groups_independent_tasks():
+    # Diamond: root -> (left, right) -> leaf, declared out of order
+    def task(id_: str, depends_on: list[str]) -> Task:
+        return Task(
+            id=id_,
+            prompt="Role: Test\nIntent: Task\nContext:\nConstraints:\nOutput:",
+            dependsOn=[Dependency(taskId=dep, inputs=[make_input()]) for dep in depends_on],
+            outputs=[make_output()],
+        )
+
+    plan = TaskPlan(
+        objective="Diamond",
+        tasks=[
+            task("leaf", ["left", "right"]),
+            task("right", ["root"]),
+            task("left", ["root"]),
+            task("root", []),
+        ],
+    )
+
+    layers = TaskGraphBuilder(plan).get_execution_layers()
+
+    assert layers == [["root"], ["right", "left"], ["leaf"]]
+
+
+def test_get_execution_layers_raises_on_cycle():
+    plan = TaskPlan(
+        objective="Cycle",
+        tasks=[
+            Task(id="A", prompt="p", dependsOn=[Dependency(taskId="B")]),
+            Task(id="B", prompt="p", dependsOn=[Dependency(taskId="A")]),
+            Task(id="C", prompt="p"),
+        ],
+    )
+
+    with pytest.raises(CycleError):
+        TaskGraphBuilder(plan).get_execution_layers()
+
+
+def test_builder_rejects_duplicate_task_ids():
+    plan = TaskPlan(
+        objective="Duplicates",
+        tasks=[Task(id="A", prompt="p"), Task(id="A", prompt="p")],
+    )
+
+    with pytest.raises(ValueError):
+        TaskGraphBuilder(plan)
+
+
+def test_validate_refs_raises_on_undefined_dependency():
+    plan = TaskPlan(
+        objective="Undefined dependency",
+        tasks=[Task(id="A", prompt="p", dependsOn=[Dependency(taskId="missing")])],
+    )
+
+    with pytest.raises(KeyError):
+        TaskGraphBuilder(plan).validate_refs()
+
+
+def test_get_execution_layers_is_computed_once():
+    plan = TaskPlan(
+        objective="Chain",
+        tasks=[
+            Task(id="A", prompt="p"),
+            Task(id="B", prompt="p", dependsOn=[Dependency(taskId="A")]),
+        ],
+    )
+    builder = TaskGraphBuilder(plan)
+
+    assert builder.get_execution_layers() is builder.get_execution_layers()
+    assert builder.tasks_by_id["B"] is plan.tasks[1]
+
+
+def test_mark_done_releases_tasks_once_all_dependencies_complete():
+    # D depends on B and C, which both depend on A
+    plan = TaskPlan(
+        objective="Diamond",
+        tasks=[
+            Task(id="A", prompt="p"),
+            Task(id="B", prompt="p", dependsOn=[Dependency(taskId="A")]),
+            Task(id="C", prompt="p", dependsOn=[Dependency(taskId="A")]),
+            Task(id="D", prompt="p", dependsOn=[Dependency(taskId="B"), Dependency(taskId="C")]),
+        ],
+    )
+    builder = TaskGraphBuilder(plan)
+
+    assert list(builder.get_ready_queue()) == ["A"]
+    assert builder.mark_done("A") == ["B", "C"]
+    assert builder.mark_done("C") == []
+    assert builder.mark_done("B") == ["D"]
+    assert builder.mark_done("D") == []
+
+    # A new ready queue starts the schedule over
+    assert list(builder.get_ready_queue()) == ["A"]
+    assert builder.mark_done("A") == ["B", "C"]
+
+
+def test_get_execution_layers_runs_independent_tasks_in_one_layer():
+    plan = TaskPlan(
+        objective="Independent",
+        tasks=[Task(id="B", prompt="p"), Task(id="A", prompt="p"), Task(id="C", prompt="p")],
+    )
+
+    assert TaskGraphBuilder(plan).get_execution_layers() == [["B", "A", "C"]]
+    assert TaskGraphBuilder(TaskPlan(objective="Empty")).get_execution_layers() == []
+
+
+def test_get_execution_layers_keeps_task_plan_order_in_later_layers():
+    # c is released by b and d by a, but c comes first in the TaskPlan
+    plan = TaskPlan(
+        objective="Crossed",
+        tasks=[
+            Task(id="a", prompt="p"),
+            Task(id="b", prompt="p"),
+            Task(id="c", prompt="p", dependsOn=[Dependency(taskId="b")]),
+            Task(id="d", prompt="p", dependsOn=[Dependency(taskId="a")]),
+        ],
+    )
+
+    assert TaskGraphBuilder(plan).get_execution_layers() == [["a", "b"], ["c", "d"]]
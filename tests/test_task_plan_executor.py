@@ -0,0 +1,172 @@
+import asyncio
+from graphlib import CycleError
+
+import pytest
+from pydantic_ai.usage import RunUsage
+
+from task_decomposition.delegate_runner import DelegateContext, DelegateRunner
+from task_decomposition.models_schema import TaskPlan, Task, Dependency, Input, Output
+from task_decomposition.task_graph_builder import DelegateRunResult
+from task_decomposition.task_plan_executor import TaskPlanExecutor
+
+
+class FakeDelegateRunner(DelegateRunner):
+    """
+    DelegateRunner that never calls an LLM. Each task outputs its own id, and
+    the runner records start order and the peak number of concurrent runs.
+    """
+
+    def __init__(self, delays: dict[str, float] | None = None) -> None:
+        self.delays = delays or {}
+        self.started: list[str] = []
+        self.finished: list[str] = []
+        self.contexts: dict[str, DelegateContext] = {}
+        self._running = 0
+        self.max_running = 0
+
+    async def run_async(self, task: Task, delegate_context: DelegateContext) -> DelegateRunResult:
+        self.started.append(task.id)
+        self.contexts[task.id] = delegate_context
+        self._running += 1
+        self.max_running = max(self.max_running, self._running)
+        # Yield to the event loop so sibling tasks get a chance to start
+        await asyncio.sleep(self.delays.get(task.id, 0.01))
+        self._running -= 1
+        self.finished.append(task.id)
+        return DelegateRunResult(
+            id=task.id,
+            output_types=[o.type for o in task.outputs],
+            outputs=[task.id for _ in task.outputs],
+            usage=RunUsage(requests=1, input_tokens=100, cache_read_tokens=40, output_tokens=10),
+        )
+
+
+def make_task(id_: str, depends_on: list[str] | None = None) -> Task:
+    return Task(
+        id=id_,
+        prompt="Role: X\nIntent: Y\nContext: Z\nConstraints: C\nOutput: O\n",
+        dependsOn=[
+            Dependency(taskId=dep_id, inputs=[Input(description="desc", type="string")])
+            for dep_id in depends_on or []
+        ],
+        outputs=[Output(description="desc", type="string")],
+    )
+
+
+def test_execute_runs_independent_tasks_concurrently():
+    # Diamond: root -> (left, right) -> leaf
+    plan = TaskPlan(
+        objective="diamond",
+        tasks=[
+            make_task("leaf", ["left", "right"]),
+            make_task("left", ["root"]),
+            make_task("right", ["root"]),
+            make_task("root"),
+        ],
+    )
+    runner = FakeDelegateRunner()
+    executor = TaskPlanExecutor(plan, runner)
+
+    executor.execute()
+
+    assert set(executor.results) == {"root", "left", "right", "leaf"}
+    assert runner.started[0] == "root"
+    assert set(runner.started[1:3]) == {"left", "right"}
+    assert runner.started[3] == "leaf"
+    # left and right share a wave, so they must have overlapped
+    assert runner.max_running == 2
+
+    leaf_context = runner.contexts["leaf"]
+    assert set(leaf_context.dependency_results) == {"left", "right"}
+    assert leaf_context.dependency_results["left"].outputs == ["left"]
+    # Tasks without dependencies share the empty context
+    assert runner.contexts["root"] is DelegateContext.EMPTY
+
+    # Usage from every delegate run is summed, cached tokens included
+    assert executor.usage.requests == 4
+    assert executor.usage.input_tokens == 400
+    assert executor.usage.cache_read_tokens == 160
+
+
+def test_execute_starts_tasks_as_soon_as_their_dependencies_complete():
+    # "fast_child" only waits for "fast", not for the unrelated "slow" task
+    plan = TaskPlan(
+        objective="uneven",
+        tasks=[make_task("slow"), make_task("fast"), make_task("fast_child", ["fast"])],
+    )
+    runner = FakeDelegateRunner(delays={"slow": 0.2})
+    executor = TaskPlanExecutor(plan, runner)
+
+    executor.execute()
+
+    assert runner.finished == ["fast", "fast_child", "slow"]
+    assert executor.results["fast_child"].outputs == ["fast_child"]
+
+
+def test_execute_raises_on_cycle():
+    plan = TaskPlan(
+        objective="cycle",
+        tasks=[make_task("t1", ["t2"]), make_task("t2", ["t1"])],
+    )
+    executor = TaskPlanExecutor(plan, FakeDelegateRunner())
+
+    with pytest.raises(CycleError):
+        executor.execute()
+
+
+def test_execute_respects_max_concurrency():
+    plan = TaskPlan(
+        objective="fan-out",
+        tasks=[make_task(f"t{i}") for i in range(4)],
+    )
+    runner = FakeDelegateRunner()
+    executor = TaskPlanExecutor(plan, runner, max_concurrency=2)
+
+    executor.execute()
+
+    assert len(executor.results) == 4
+    assert runner.max_running == 2
+
+
+class FailingDelegateRunner(FakeDelegateRunner):
+    """
+    FakeDelegateRunner whose "bad" task raises, recording the tasks that were
+    cancelled while running.
+    """
+
+    def __init__(self, delays: dict[str, float] | None = None) -> None:
+        super().__init__(delays)
+        self.cancelled: list[str] = []
+
+    async def run_async(self, task: Task, delegate_context: DelegateContext) -> DelegateRunResult:
+        if task.id == "bad":
+            await asyncio.sleep(0.01)
+            raise RuntimeError("delegate failed")
+        try:
+            return await super().run_async(task, delegate_context)
+        except asyncio.CancelledError:
+            self.cancelled.append(task.id)
+            raise
+
+
+def test_execute_cancels_running_tasks_before_raising():
+    plan = TaskPlan(objective="failure", tasks=[make_task("slow"), make_task("bad")])
+    runner = FailingDelegateRunner(delays={"slow": 10})
+    executor = TaskPlanExecutor(plan, runner)
+
+    async def execute_and_check() -> list[str]:
+        with pytest.raises(RuntimeError, match="delegate failed"):
+            await executor.execute_async()
+        # Checked before the event loop shuts down and cancels leftover tasks
+        return list(runner.cancelled)
+
+    assert asyncio.run(execute_and_check()) == ["slow"]
+    assert runner.finished == []
+
+
+@pytest.mark.parametrize("max_concurrency", [0, -1])
+def test_executor_rejects_max_concurrency_below_one(max_concurrency):
+    plan = TaskPlan(objective="single", tasks=[make_task("t1")])
+
+    with pytest.raises(ValueError):
+        TaskPlanExecutor(plan, FakeDelegateRunner(), max_concurrency=max_concurrency)
@@ -1,9 +1,39 @@
+import random
+from functools import lru_cache
+from graphlib import CycleError, TopologicalSorter
+from typing import Callable, Sequence
+
 import pytest
 
 from task_decomposition.models_schema import TaskPlan, Task, Dependency, Input, Output
 from task_decomposition.task_plan_validator import TaskPlanValidator
 
 
+# The models are frozen, so identical fixtures can be built once and shared
+@lru_cache(maxsize=None)
+def _make_input(description: str = "desc", type_: str = "string") -> Input:
+    return Input(description=description, type=type_)
+
+
+@lru_cache(maxsize=None)
+def _make_output(description: str = "desc", type_: str = "string") -> Output:
+    return Output(description=description, type=type_)
+
+
+def _make_task(
+    id_: str,
+    prompt: str = "Role: X\nIntent: Y\nContext: Z\nConstraints: C\nOutput: O\n",
+    depends_on: Sequence[Dependency] = (),
+    outputs: Sequence[Output] = (),
+) -> Task:
+    return Task(
+        id=id_,
+        prompt=prompt,
+        dependsOn=depends_on,
+        outputs=outputs,
+    )
+
+
 class TestTaskPlanValidator:
     """
     Tests for TaskPlanValidator.
@@ -19,134 +49,102 @@ class TestTaskPlanValidator:
     def setup_method(self) -> None:
         self.validator = TaskPlanValidator()
 
-    # -------------------------------------------------------------------------
-    # Helpers
-    # -------------------------------------------------------------------------
-
-    @staticmethod
-    def _make_input(description: str = "desc", type_: str = "string") -> Input:
-        return Input(description=description, type=type_)
-
-    @staticmethod
-    def _make_output(description: str = "desc", type_: str = "string") -> Output:
-        return Output(description=description, type=type_)
-
-    @staticmethod
-    def _make_task(
-        id_: str,
-        prompt: str = "Role: X\nIntent: Y\nContext: Z\nConstraints: C\nOutput: O\n",
-        depends_on: list[Dependency] | None = None,
-        outputs: list[Output] | None = None,
-    ) -> Task:
-        return Task(
-            id=id_,
-            prompt=prompt,
-            dependsOn=depends_on or [],
-            outputs=outputs or [],
-        )
-
     # -------------------------------------------------------------------------
     # Cyclic dependency tests
     # -------------------------------------------------------------------------
 
     @pytest.mark.parametrize(
-        "name, task_plan, expected_valid",
+        "build_plan, expected_valid",
         [
             pytest.param(
-                "no_tasks_is_trivially_acyclic",
-                TaskPlan(objective="empty", tasks=[]),
+                lambda: TaskPlan(objective="empty", tasks=[]),
                 True,
                 id="no_tasks_is_trivially_acyclic",
             ),
             pytest.param(
-                "single_task_no_dependencies",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="single",
                     tasks=[
-                        _make_task.__func__("t1"),  # type: ignore[attr-defined]
+                        _make_task("t1"),
                     ],
                 ),
                 True,
                 id="single_task_no_dependencies",
             ),
             pytest.param(
-                "two_tasks_linear_dependency",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="linear",
                     tasks=[
-                        _make_task.__func__("t1"),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        _make_task("t1"),
+                        _make_task(
                             "t2",
                             depends_on=[
                                 Dependency(taskId="t1", inputs=[]),
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 True,
                 id="two_tasks_linear_dependency",
             ),
             pytest.param(
-                "simple_two_node_cycle",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="cycle",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "t1",
                             depends_on=[Dependency(taskId="t2", inputs=[])],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "t2",
                             depends_on=[Dependency(taskId="t1", inputs=[])],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
                 id="simple_two_node_cycle",
             ),
             pytest.param(
-                "three_node_cycle",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="3-cycle",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "t1",
                             depends_on=[Dependency(taskId="t2", inputs=[])],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "t2",
                             depends_on=[Dependency(taskId="t3", inputs=[])],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "t3",
                             depends_on=[Dependency(taskId="t1", inputs=[])],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
                 id="three_node_cycle",
             ),
             pytest.param(
-                "diamond_shape_no_cycle",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="diamond",
                     tasks=[
-                        _make_task.__func__("root"),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        _make_task("root"),
+                        _make_task(
                             "left",
                             depends_on=[Dependency(taskId="root", inputs=[])],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "right",
                             depends_on=[Dependency(taskId="root", inputs=[])],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "leaf",
                             depends_on=[
                                 Dependency(taskId="left", inputs=[]),
                                 Dependency(taskId="right", inputs=[]),
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 True,
@@ -155,13 +153,13 @@ class TestTaskPlanValidator:
         ],
     )
     def test_cyclic_dependencies(
-        self, name: str, task_plan: TaskPlan, expected_valid: bool
+        self, build_plan: Callable[[], TaskPlan], expected_valid: bool
     ) -> None:
         """
         TaskPlanValidator should return False when the dependency graph
         contains any cycle, and True when it is acyclic.
         """
-        result = self.validator.validate(task_plan)
+        result = self.validator.validate(build_plan())
         assert result is expected_valid
 
     # -------------------------------------------------------------------------
@@ -169,115 +167,111 @@ class TestTaskPlanValidator:
     # -------------------------------------------------------------------------
 
     @pytest.mark.parametrize(
-        "name, task_plan, expected_valid",
+        "build_plan, expected_valid",
         [
             pytest.param(
-                "valid_matching_counts_and_types",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="valid-io",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer_valid",
                             outputs=[
-                                _make_output.__func__(type_="string"),
-                                _make_output.__func__(type_="integer"),
+                                _make_output(type_="string"),
+                                _make_output(type_="integer"),
                             ],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "consumer_valid",
                             depends_on=[
                                 Dependency(
                                     taskId="producer_valid",
                                     inputs=[
-                                        _make_input.__func__(type_="string"),
-                                        _make_input.__func__(type_="integer"),
+                                        _make_input(type_="string"),
+                                        _make_input(type_="integer"),
                                     ],
                                 )
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 True,
                 id="valid_matching_counts_and_types",
             ),
             pytest.param(
-                "invalid_fewer_inputs_than_outputs",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="fewer-inputs",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer_more_outputs",
                             outputs=[
-                                _make_output.__func__(type_="string"),
-                                _make_output.__func__(type_="integer"),
+                                _make_output(type_="string"),
+                                _make_output(type_="integer"),
                             ],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "consumer_fewer_inputs",
                             depends_on=[
                                 Dependency(
                                     taskId="producer_more_outputs",
                                     inputs=[
-                                        _make_input.__func__(type_="string"),
+                                        _make_input(type_="string"),
                                     ],
                                 )
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
                 id="invalid_fewer_inputs_than_outputs",
             ),
             pytest.param(
-                "invalid_more_inputs_than_outputs",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="more-inputs",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer_fewer_outputs",
                             outputs=[
-                                _make_output.__func__(type_="string"),
+                                _make_output(type_="string"),
                             ],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "consumer_more_inputs",
                             depends_on=[
                                 Dependency(
                                     taskId="producer_fewer_outputs",
                                     inputs=[
-                                        _make_input.__func__(type_="string"),
-                                        _make_input.__func__(type_="integer"),
+                                        _make_input(type_="string"),
+                                        _make_input(type_="integer"),
                                     ],
                                 )
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
                 id="invalid_more_inputs_than_outputs",
             ),
             pytest.param(
-                "invalid_mismatched_types",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="type-mismatch",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer_type_mismatch",
                             outputs=[
-                                _make_output.__func__(type_="string"),
+                                _make_output(type_="string"),
                             ],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                        ),
+                        _make_task(
                             "consumer_type_mismatch",
                             depends_on=[
                                 Dependency(
                                     taskId="producer_type_mismatch",
                                     inputs=[
-                                        _make_input.__func__(type_="integer"),
+                                        _make_input(type_="integer"),
                                     ],
                                 )
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
@@ -286,7 +280,7 @@ class TestTaskPlanValidator:
         ],
     )
     def test_invalid_input_outputs(
-        self, name: str, task_plan: TaskPlan, expected_valid: bool
+        self, build_plan: Callable[[], TaskPlan], expected_valid: bool
     ) -> None:
         """
         For each dependency, the declared inputs must be compatible with the
@@ -297,7 +291,7 @@ class TestTaskPlanValidator:
 
         If any dependency violates these rules, validate(...) should return False.
         """
-        result = self.validator.validate(task_plan)
+        result = self.validator.validate(build_plan())
         assert result is expected_valid
 
     # -------------------------------------------------------------------------
@@ -305,91 +299,87 @@ class TestTaskPlanValidator:
     # -------------------------------------------------------------------------
 
     @pytest.mark.parametrize(
-        "name, task_plan, expected_valid",
+        "build_plan, expected_valid",
         [
             pytest.param(
-                "no_dependencies_is_valid",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="no-deps",
                     tasks=[
-                        _make_task.__func__("t1"),  # type: ignore[attr-defined]
+                        _make_task("t1"),
                     ],
                 ),
                 True,
                 id="no_dependencies_is_valid",
             ),
             pytest.param(
-                "all_dependencies_defined",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="all-defined",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer",
-                            outputs=[_make_output.__func__()],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                            outputs=[_make_output()],
+                        ),
+                        _make_task(
                             "consumer_valid",
                             depends_on=[
                                 Dependency(
                                     taskId="producer",
-                                    inputs=[_make_input.__func__()],
+                                    inputs=[_make_input()],
                                 )
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 True,
                 id="all_dependencies_defined",
             ),
             pytest.param(
-                "undefined_dependency_task_id",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="undefined-dep",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer",
-                            outputs=[_make_output.__func__()],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                            outputs=[_make_output()],
+                        ),
+                        _make_task(
                             "consumer_invalid",
                             depends_on=[
                                 Dependency(
                                     taskId="missing_task",
-                                    inputs=[_make_input.__func__()],
+                                    inputs=[_make_input()],
                                 )
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
                 id="undefined_dependency_task_id",
             ),
             pytest.param(
-                "multiple_dependencies_one_undefined",
-                TaskPlan(
+                lambda: TaskPlan(
                     objective="mixed-deps",
                     tasks=[
-                        _make_task.__func__(
+                        _make_task(
                             "producer",
-                            outputs=[_make_output.__func__()],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                            outputs=[_make_output()],
+                        ),
+                        _make_task(
                             "another",
-                            outputs=[_make_output.__func__()],
-                        ),  # type: ignore[attr-defined]
-                        _make_task.__func__(
+                            outputs=[_make_output()],
+                        ),
+                        _make_task(
                             "consumer_mixed",
                             depends_on=[
                                 Dependency(
                                     taskId="producer",
-                                    inputs=[_make_input.__func__()],
+                                    inputs=[_make_input()],
                                 ),
                                 Dependency(
                                     taskId="non_existent",
-                                    inputs=[_make_input.__func__()],
+                                    inputs=[_make_input()],
                                 ),
                             ],
-                        ),  # type: ignore[attr-defined]
+                        ),
                     ],
                 ),
                 False,
@@ -398,12 +388,142 @@ class TestTaskPlanValidator:
         ],
     )
     def test_undefined_dependency(
-        self, name: str, task_plan: TaskPlan, expected_valid: bool
+        self, build_plan: Callable[[], TaskPlan], expected_valid: bool
     ) -> None:
         """
         Every Dependency.taskId must reference an existing Task.id in the same
         TaskPlan. If any dependency refers to a non-existent task, validate(...)
         should return False.
         """
-        result = self.validator.validate(task_plan)
+        result = self.validator.validate(build_plan())
         assert result is expected_valid
+
+    def test_last_error_describes_failure(self) -> None:
+        """
+        last_error explains why the most recent validate(...) call failed and
+        is cleared again by a successful call.
+        """
+        duplicate = TaskPlan(
+            objective="duplicate",
+            tasks=[_make_task("t1"), _make_task("t1")],
+        )
+        valid = TaskPlan(objective="valid", tasks=[_make_task("t1")])
+
+        assert self.validator.validate(duplicate) is False
+        assert self.validator.last_error == "duplicate task id 't1' detected"
+
+        assert self.validator.validate(valid) is True
+        assert self.validator.last_error is None
+
+    def test_validate_partial_rejects_errors_among_received_tasks(self) -> None:
+        """
+        validate_partial(...) rejects a TaskPlan that is still arriving as soon
+        as complete tasks conflict, but ignores references to tasks that have
+        not been received yet and the possibly incomplete last task.
+        """
+        producer = _make_task("t1", outputs=[_make_output(type_="integer")])
+        mismatched = _make_task(
+            "t2",
+            depends_on=[Dependency(taskId="t1", inputs=[_make_input(type_="string")])],
+        )
+        forward_reference = _make_task(
+            "t2", depends_on=[Dependency(taskId="t9", inputs=[_make_input()])]
+        )
+
+        assert self.validator.validate_partial([producer, forward_reference, _make_task("t3")]) is True
+        assert self.validator.validate_partial([producer, _make_task("t1")]) is True
+        assert self.validator.validate_partial([producer, producer, _make_task("t3")]) is False
+        assert self.validator.last_error == "duplicate task id 't1' detected"
+        assert self.validator.validate_partial([producer, mismatched, _make_task("t3")]) is False
+
+    def test_validate_partial_rejects_cycle_once_it_is_closed(self) -> None:
+        """
+        validate_partial(...) rejects a dependency cycle as soon as every task
+        on it has been received, before the rest of the TaskPlan arrives.
+        """
+        t1 = _make_task("t1", depends_on=[Dependency(taskId="t3")])
+        t2 = _make_task("t2", depends_on=[Dependency(taskId="t1")])
+        t3 = _make_task("t3", depends_on=[Dependency(taskId="t2")])
+        pending = _make_task("t4")
+
+        assert self.validator.validate_partial([t1, t2, pending]) is True
+        assert self.validator.validate_partial([t1, t2, t3, pending]) is False
+        assert self.validator.last_error == (
+            "cyclic dependency detected in task graph; cycles: t1, t2, t3"
+        )
+
+    def test_long_dependency_chain_does_not_hit_recursion_limit(self) -> None:
+        """
+        A dependency chain deeper than the interpreter's recursion limit is
+        still validated.
+        """
+        length = 5000
+        tasks = [
+            _make_task(f"t{i}", depends_on=[Dependency(taskId=f"t{i + 1}")])
+            for i in range(length)
+        ]
+        tasks.append(_make_task(f"t{length}"))
+
+        assert self.validator.validate(TaskPlan(objective="chain", tasks=tasks)) is True
+
+    def test_last_error_names_every_cycle(self) -> None:
+        """
+        When the dependency graph is cyclic, last_error lists the tasks of
+        every cycle, including a task that depends on itself, and not the
+        tasks that only depend on a cycle.
+        """
+        tasks = [
+            _make_task("a", depends_on=[Dependency(taskId="b")]),
+            _make_task("b", depends_on=[Dependency(taskId="a")]),
+            _make_task("c", depends_on=[Dependency(taskId="c")]),
+            _make_task("d", depends_on=[Dependency(taskId="e")]),
+            _make_task("e", depends_on=[Dependency(taskId="f")]),
+            _make_task("f", depends_on=[Dependency(taskId="d")]),
+            _make_task("g", depends_on=[Dependency(taskId="a")]),
+        ]
+
+        assert self.validator.validate(TaskPlan(objective="cycles", tasks=tasks)) is False
+        assert self.validator.last_error == (
+            "cyclic dependency detected in task graph; cycles: a, b; c; d, e, f"
+        )
+
+
+def _random_plan(seed: int) -> tuple[TaskPlan, dict[str, list[str]]]:
+    """
+    Build a random TaskPlan of up to 20 tasks with random dependencies,
+    including the occasional self-dependency, and return it with its
+    dependency graph.
+    """
+    rng = random.Random(seed)
+    ids = [f"t{i}" for i in range(rng.randint(1, 20))]
+    density = rng.uniform(0.0, 0.3)
+    graph = {task_id: [dep_id for dep_id in ids if rng.random() < density] for task_id in ids}
+    rng.shuffle(ids)
+    plan = TaskPlan(
+        objective=f"random-{seed}",
+        tasks=[
+            _make_task(task_id, depends_on=[Dependency(taskId=dep_id) for dep_id in graph[task_id]])
+            for task_id in ids
+        ],
+    )
+    return plan, graph
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_validate_agrees_with_graphlib_on_random_graphs(seed: int) -> None:
+    """
+    On random dependency graphs, validate(...) accepts exactly the plans that
+    graphlib can order, and names a cycle when it rejects one.
+    """
+    plan, graph = _random_plan(seed)
+    try:
+        TopologicalSorter(graph).prepare()
+        acyclic = True
+    except CycleError:
+        acyclic = False
+
+    validator = TaskPlanValidator()
+
+    assert validator.validate(plan) is acyclic
+    if not acyclic:
+        assert validator.last_error.startswith("cyclic dependency detected in task graph; cycles: ")